@@ -0,0 +1,206 @@
+"""思维导图性能基准测试
+
+用法:
+    python benchmark.py --nodes 100000 --history 50
+    python benchmark.py startup
+    python benchmark.py json --nodes 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import tkinter as tk
+
+from test import (MindMapNode, NodeSizes, MapSnapshot, SearchIndex,
+                  write_map_json, read_map_json)
+
+SETTINGS = {
+    "节点外观": {
+        "根节点宽度": 140,
+        "根节点高度": 50,
+        "子节点最小宽度": 100,
+        "子节点最小高度": 40,
+    }
+}
+
+
+class LegacyNode:
+    """旧版节点表示：每个实例一个__dict__，宽高各存一份"""
+    def __init__(self, x, y, settings, text="", parent=None):
+        self.x = x
+        self.y = y
+        self.vx = 0
+        self.vy = 0
+        self.target_x = x
+        self.target_y = y
+        self.text = text
+        self.parent = parent
+        self.children = []
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.width = settings["节点外观"]["根节点宽度"] if parent is None else max(
+            settings["节点外观"]["子节点最小宽度"],
+            settings["节点外观"]["根节点宽度"] - self.depth * 10
+        )
+        self.height = settings["节点外观"]["根节点高度"] if parent is None else max(
+            settings["节点外观"]["子节点最小高度"],
+            settings["节点外观"]["根节点高度"] - self.depth * 5
+        )
+        self.expanded = False
+
+    def to_dict(self):
+        return {
+            'x': self.x,
+            'y': self.y,
+            'text': self.text,
+            'expanded': self.expanded,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+def build_tree(factory, sizes, count, seed=0):
+    """随机生成一棵树，文本在兄弟节点之间大量重复"""
+    rng = random.Random(seed)
+    root = factory(0.0, 0.0, sizes, "中心主题")
+    root.expanded = True
+    nodes = [root]
+    for i in range(count - 1):
+        parent = nodes[rng.randrange(max(1, len(nodes) // 8))]
+        # 每次拼接出新的字符串对象，模拟LLM返回和粘贴产生的重复文本
+        text = "".join(["子主题", str(i % 200)])
+        node = factory(parent.x + rng.random(), parent.y + rng.random(), sizes, text, parent)
+        node.expanded = True
+        parent.children.append(node)
+        nodes.append(node)
+    return root
+
+
+def measure(build):
+    """返回(结果, 占用字节数, 耗时)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def measure_peak(run):
+    """返回(峰值字节数, 耗时)，耗时单独测量以免受tracemalloc影响"""
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def bench_memory(count, history):
+    mb = 1024 * 1024
+    legacy_root, legacy_nodes, _ = measure(
+        lambda: build_tree(LegacyNode, SETTINGS, count))
+    _, legacy_snapshot, _ = measure(legacy_root.to_dict)
+    del legacy_root
+
+    sizes = NodeSizes(SETTINGS)
+    root, nodes, _ = measure(lambda: build_tree(MindMapNode, sizes, count))
+    _, snapshot, snapshot_time = measure(lambda: MapSnapshot(root))
+    index = SearchIndex()
+    _, index_size, index_time = measure(lambda: index.rebuild(root))
+
+    legacy_total = legacy_nodes + legacy_snapshot * history
+    total = nodes + snapshot * history + index_size
+    print(f"节点数: {count}, 历史记录: {history}")
+    print(f"  旧版节点:     {legacy_nodes / mb:8.1f} MB")
+    print(f"  紧凑节点:     {nodes / mb:8.1f} MB")
+    print(f"  旧版快照:     {legacy_snapshot / mb:8.1f} MB/次")
+    print(f"  扁平快照:     {snapshot / mb:8.1f} MB/次 ({snapshot_time * 1000:.0f} ms)")
+    print(f"  搜索索引:     {index_size / mb:8.1f} MB ({index_time * 1000:.0f} ms)")
+    print(f"  旧版合计:     {legacy_total / mb:8.1f} MB")
+    print(f"  当前合计:     {total / mb:8.1f} MB")
+    print(f"  节省:         {(1 - total / legacy_total) * 100:8.1f} %")
+
+
+def bench_json(count):
+    """整树序列化与流式读写的峰值内存对比"""
+    mb = 1024 * 1024
+    sizes = NodeSizes(SETTINGS)
+    root = build_tree(MindMapNode, sizes, count)
+    fd, filename = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+
+    def dump_tree():
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(root.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def dump_stream():
+        with open(filename, 'w', encoding='utf-8') as f:
+            write_map_json(MapSnapshot(root), f)
+
+    def load_tree():
+        with open(filename, 'r', encoding='utf-8') as f:
+            MindMapNode.from_dict(json.load(f), sizes)
+
+    def load_stream():
+        with open(filename, 'r', encoding='utf-8') as f:
+            read_map_json(f, sizes)
+
+    try:
+        print(f"JSON导入导出 (节点数: {count})")
+        for label, run in (("整树导出", dump_tree), ("流式导出", dump_stream),
+                           ("整树导入", load_tree), ("流式导入", load_stream)):
+            peak, elapsed = measure_peak(run)
+            print(f"  {label}:     {peak / mb:8.1f} MB 峰值 ({elapsed * 1000:.0f} ms)")
+    finally:
+        os.remove(filename)
+
+
+def bench_startup():
+    """冷启动耗时：独立进程中导入模块，以及创建窗口到首帧绘制"""
+    code = ("import time; start = time.perf_counter(); import test; "
+            "print(time.perf_counter() - start)")
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    print("冷启动")
+    print(f"  导入模块:     {float(result.stdout) * 1000:8.1f} ms")
+
+    from test import MindMap
+    try:
+        start = time.perf_counter()
+        app = MindMap()
+        app.root.update()
+        elapsed = time.perf_counter() - start
+    except tk.TclError as e:
+        print(f"  首帧绘制:     跳过 ({e})")
+        return
+    print(f"  首帧绘制:     {elapsed * 1000:8.1f} ms")
+    app.root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="思维导图性能基准测试")
+    parser.add_argument("suite", nargs="?", default="all",
+                        choices=("all", "memory", "json", "startup"), help="要运行的测试")
+    parser.add_argument("--nodes", type=int, default=100000, help="节点数量")
+    parser.add_argument("--history", type=int, default=50, help="历史记录数量")
+    args = parser.parse_args()
+    if args.suite in ("all", "memory"):
+        bench_memory(args.nodes, args.history)
+    if args.suite in ("all", "json"):
+        bench_json(args.nodes)
+    if args.suite in ("all", "startup"):
+        bench_startup()
+
+
+if __name__ == "__main__":
+    main()
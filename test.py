@@ -1,1000 +1,2661 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, colorchooser
-import threading
-import math
-import json
-import queue
-from langchain.llms import Ollama
-from langchain.callbacks.manager import CallbackManager
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from tkinter import PhotoImage
-from PIL import Image, ImageTk
-import copy
-
-class MindMapNode:
-    def __init__(self, x, y, settings, text="", parent=None):
-        self.x = x
-        self.y = y
-        self.vx = 0  # 速度
-        self.vy = 0
-        self.target_x = x  # 目标位置
-        self.target_y = y
-        self.text = text
-        self.parent = parent
-        self.children = []
-        self.depth = 0 if parent is None else parent.depth + 1
-        # 根据深度调整节点大小
-        self.width = settings["节点外观"]["根节点宽度"] if parent is None else max(
-            settings["节点外观"]["子节点最小宽度"], 
-            settings["节点外观"]["根节点宽度"] - self.depth * 10
-        )
-        self.height = settings["节点外观"]["根节点高度"] if parent is None else max(
-            settings["节点外观"]["子节点最小高度"], 
-            settings["节点外观"]["根节点高度"] - self.depth * 5
-        )
-        self.expanded = False # 是否展开子节点
-
-    def to_dict(self):
-        """将节点转换为字典格式以便序列化"""
-        return {
-            'x': self.x,
-            'y': self.y,
-            'text': self.text,
-            'expanded': self.expanded,
-            'children': [child.to_dict() for child in self.children]
-        }
-
-    @classmethod
-    def from_dict(cls, data, parent=None):
-        """从字典创建节点"""
-        node = cls(data['x'], data['y'], data['text'], parent)
-        node.expanded = data['expanded']
-        for child_data in data['children']:
-            child = cls.from_dict(child_data, node)
-            node.children.append(child)
-        return node
-
-class MindMap:
-    def __init__(self):
-        self.settings = {
-            # 物理引擎参数
-            "物理引擎": {
-                "弹簧系数": 0.05,  # spring_k
-                "排斥力系数": 8000,  # repulsion
-                "阻尼系数": 0.8,    # damping
-                "目标距离": 250,    # target_dist
-                "线之间排斥力": 1000, # line_repulsion
-                "最大速度": 10.0,   # max_velocity
-                "最小距离": 50.0,   # min_distance
-            },
-            # 节点外观
-            "节点外观": {
-                "文字初始大小": 14,  # word_size
-                "节点距离系数": 1.2, # node_distance_rate
-                "根节点宽度": 140,   # root_width
-                "根节点高度": 50,    # root_height
-                "子节点最小宽度": 100, # min_child_width
-                "子节点最小高度": 40, # min_child_height
-                "节点圆角半径": 10,  # node_radius
-                "节点阴影": True,   # node_shadow
-                "连接线粗细": 2,    # line_width
-                "连接线颜色": "#666666", # line_color
-                "连接线样式": "曲线", # line_style: 直线/曲线/折线
-            },
-            # 自动生成参数
-            "自动生成": {
-                "生成间隔(毫秒)": 5000,  # auto_gen_interval
-                "单次生成数量": 8,      # gen_num
-                "包含父节点路径": True,   # include_parent_path
-                "最大生成深度": 5,      # max_depth
-                "智能排序": True,      # smart_sort
-            },
-            # 布局参数
-            "布局": {
-                "最小缩放比例": 0.2,     # min_scale
-                "最大缩放比例": 5.0,     # max_scale
-                "子节点角度范围": 120,   # child_angle_range
-                "自动居中": True,      # auto_center
-                "动画速度": 1.0,      # animation_speed
-                "网格显示": False,    # show_grid
-                "网格大小": 50,      # grid_size
-            },
-            # 主题配色
-            "主题配色": {
-                "背景色": "#FFFFFF",    # background_color
-                "根节点": "#E3F2FD",    # root_color
-                "一级节点": "#BBDEFB",  # level1_color
-                "二级节点": "#90CAF9",  # level2_color
-                "三级节点": "#64B5F6",  # level3_color
-                "选中节点": "#81D4FA",  # selected_color
-                "文字颜色": "#333333",  # text_color
-                "按钮颜色": "#2196F3",  # button_color
-            }
-        }
-        self.root = tk.Tk()
-        self.root.title("思维导图生成器")
-        self.root.geometry("1200x800")
-        
-        # 设置主题样式
-        style = ttk.Style()
-        style.theme_use('clam')
-        
-        # 自定义颜色和样式
-        style.configure("TButton",
-            padding=8,
-            relief="flat",
-            background=self.settings["主题配色"]["按钮颜色"],
-            foreground="white",
-            font=("Microsoft YaHei", 10, "bold"),
-            borderwidth=0
-        )
-        
-        style.map("TButton",
-            background=[('active', '#1976D2'), ('pressed', '#0D47A1')],
-            foreground=[('active', 'white'), ('pressed', 'white')]
-        )
-        
-        style.configure("TEntry",
-            padding=8,
-            relief="flat",
-            font=("Microsoft YaHei", 10),
-            fieldbackground="#F5F5F5",
-            borderwidth=1
-        )
-        
-        style.configure("Toolbar.TFrame",
-            background=self.settings["主题配色"]["背景色"],
-            relief="raised",
-            borderwidth=1
-        )
-        
-        # 加载图标资源
-        try:
-            self.start_icon = PhotoImage(file="assets/start.png").subsample(2,2)
-            self.add_icon = PhotoImage(file="assets/add.png").subsample(2,2)
-            self.settings_icon = PhotoImage(file="assets/settings.png").subsample(2,2)
-            self.new_icon = PhotoImage(file="assets/new.png").subsample(2,2)
-            self.import_icon = PhotoImage(file="assets/import.png").subsample(2,2) 
-            self.export_icon = PhotoImage(file="assets/export.png").subsample(2,2)
-            self.copy_icon = PhotoImage(file="assets/copy.png").subsample(2,2)
-            self.paste_icon = PhotoImage(file="assets/paste.png").subsample(2,2)
-            self.undo_icon = PhotoImage(file="assets/undo.png").subsample(2,2)
-            self.redo_icon = PhotoImage(file="assets/redo.png").subsample(2,2)
-        except:
-            self.start_icon = None
-            self.add_icon = None
-            self.settings_icon = None
-            self.new_icon = None
-            self.import_icon = None
-            self.export_icon = None
-            self.copy_icon = None
-            self.paste_icon = None
-            self.undo_icon = None
-            self.redo_icon = None
-        
-        # 初始化Ollama LLM
-        callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
-        self.llm = Ollama(
-            model="llama3.1:8b",
-            callback_manager=callback_manager
-        )
-        
-        # 用于线程间通信的队列
-        self.llm_queue = queue.Queue()
-        self.result_queue = queue.Queue()
-        
-        # 启动LLM处理线程
-        self.llm_thread = threading.Thread(target=self.llm_worker, daemon=True)
-        self.llm_thread.start()
-        
-        # 创建主框架
-        self.main_frame = ttk.Frame(self.root)
-        self.main_frame.pack(fill="both", expand=True)
-        
-        # 工具栏
-        self.toolbar = ttk.Frame(self.main_frame, style="Toolbar.TFrame")
-        self.toolbar.pack(side="top", fill="x", padx=10, pady=5)
-
-        # 文件操作按钮
-        self.file_frame = ttk.Frame(self.toolbar)
-        self.file_frame.pack(side="left", padx=5)
-        
-        ttk.Button(self.file_frame, text="新建", image=self.new_icon, compound="left", command=self.new_map).pack(side="left", padx=2)
-        ttk.Button(self.file_frame, text="导入", image=self.import_icon, compound="left", command=self.import_map).pack(side="left", padx=2)
-        ttk.Button(self.file_frame, text="导出", image=self.export_icon, compound="left", command=self.export_map).pack(side="left", padx=2)
-        
-        # 编辑操作按钮
-        self.edit_frame = ttk.Frame(self.toolbar)
-        self.edit_frame.pack(side="left", padx=5)
-        
-        ttk.Button(self.edit_frame, text="复制", image=self.copy_icon, compound="left", command=self.copy_node).pack(side="left", padx=2)
-        ttk.Button(self.edit_frame, text="粘贴", image=self.paste_icon, compound="left", command=self.paste_node).pack(side="left", padx=2)
-        ttk.Button(self.edit_frame, text="撤销", image=self.undo_icon, compound="left", command=self.undo).pack(side="left", padx=2)
-        ttk.Button(self.edit_frame, text="重做", image=self.redo_icon, compound="left", command=self.redo).pack(side="left", padx=2)
-        
-        # 原有按钮
-        self.start_btn = ttk.Button(self.toolbar, 
-            text="开始自动生成",
-            command=self.toggle_auto_generate,
-            image=self.start_icon if self.start_icon else None,
-            compound="left"
-        )
-        self.start_btn.pack(side="left", padx=5)
-        
-        self.add_btn = ttk.Button(self.toolbar,
-            text="新建子节点",
-            command=self.add_child_node,
-            image=self.add_icon if self.add_icon else None,
-            compound="left"
-        )
-        self.add_btn.pack(side="left", padx=5)
-        
-        self.settings_btn = ttk.Button(self.toolbar,
-            text="设置",
-            command=self.show_settings,
-            image=self.settings_icon if self.settings_icon else None,
-            compound="left"
-        )
-        self.settings_btn.pack(side="left", padx=5)
-        
-        # 画布容器
-        self.canvas_frame = ttk.Frame(self.main_frame)
-        self.canvas_frame.pack(fill="both", expand=True, padx=10, pady=5)
-        
-        # 画布
-        self.canvas = tk.Canvas(
-            self.canvas_frame,
-            width=1200,
-            height=800,
-            bg=self.settings["主题配色"]["背景色"],
-            highlightthickness=0
-        )
-        self.canvas.pack(fill="both", expand=True)
-        
-        # 滚动条
-        self.h_scrollbar = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.canvas.xview)
-        self.v_scrollbar = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.canvas.yview)
-        self.canvas.configure(xscrollcommand=self.h_scrollbar.set, yscrollcommand=self.v_scrollbar.set)
-        
-        self.h_scrollbar.pack(side="bottom", fill="x")
-        self.v_scrollbar.pack(side="right", fill="y")
-        
-        # 缩放和平移相关变量
-        self.scale = 1.0
-        self.offset_x = 0
-        self.offset_y = 0
-        
-        # 节点数据
-        self.root_node = MindMapNode(600, 400, self.settings, "中心主题")
-        self.root_node.expanded = True # 根节点默认展开
-        self.selected_node = None
-        self.dragging = False
-        self.auto_generating = False
-        self.auto_gen_thread = None
-        
-        # 复制粘贴相关
-        self.clipboard = None
-        
-        # 撤销重做相关
-        self.history = []
-        self.future = []
-        self.save_state()
-        
-        # 绑定事件
-        self.canvas.bind("<Button-1>", self.on_click)
-        self.canvas.bind("<B1-Motion>", self.on_drag)
-        self.canvas.bind("<ButtonRelease-1>", self.on_release)
-        self.canvas.bind("<Button-3>", self.on_right_click)
-        self.canvas.bind("<Double-Button-1>", self.on_double_click)
-        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
-        self.root.bind("<Delete>", self.delete_selected_node)
-        self.root.bind("<Control-c>", lambda e: self.copy_node())
-        self.root.bind("<Control-v>", lambda e: self.paste_node())
-        self.root.bind("<Control-z>", lambda e: self.undo())
-        self.root.bind("<Control-y>", lambda e: self.redo())
-        
-        # 启动物理模拟和绘制循环
-        self.update_physics()
-        self.draw()
-        
-        # 启动结果处理循环
-        self.process_results()
-
-    def get_node_angle_range(self, node):
-        """计算节点的当前角度范围"""
-        if not node.parent:
-            return (-2*math.pi, 2*math.pi)
-            
-        # 如果父节点是根节点,则无限制
-        if node.parent.parent is None:
-            return (-2*math.pi, 2*math.pi)
-            
-        # 计算父节点相对于其父节点的角度
-        dx = node.parent.x - node.parent.parent.x 
-        dy = node.parent.y - node.parent.parent.y
-        parent_angle = math.atan2(dy, dx)
-            
-        # 基于父节点角度,限制在设定范围内
-        half_range = math.pi * self.settings["布局"]["子节点角度范围"]/360
-        min_angle = (parent_angle - half_range)
-        max_angle = (parent_angle + half_range)
-        
-        return (min_angle, max_angle)
-    def save_state(self):
-        """保存当前状态到历史记录"""
-        state = self.root_node.to_dict()
-        self.history.append(state)
-        self.future.clear()  # 清空重做历史
-        if len(self.history) > 50:  # 限制历史记录数量
-            self.history.pop(0)
-    def show_settings(self):
-        settings_window = tk.Toplevel(self.root)
-        settings_window.title("设置")
-        settings_window.geometry("600x800")
-        
-        style = ttk.Style()
-        style.configure("Settings.TNotebook", 
-            background=self.settings["主题配色"]["背景色"],
-            borderwidth=0
-        )
-        style.configure("Settings.TFrame",
-            background=self.settings["主题配色"]["背景色"]
-        )
-        
-        notebook = ttk.Notebook(settings_window, style="Settings.TNotebook")
-        notebook.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        entries = {}
-        
-        # 为每个分类创建一个标签页
-        for category, settings in self.settings.items():
-            frame = ttk.Frame(notebook, style="Settings.TFrame")
-            notebook.add(frame, text=category)
-            
-            canvas = tk.Canvas(frame, background=self.settings["主题配色"]["背景色"])
-            scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
-            scrollable_frame = ttk.Frame(canvas, style="Settings.TFrame")
-            
-            scrollable_frame.bind(
-                "<Configure>",
-                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-            )
-            
-            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-            
-            entries[category] = {}
-            row = 0
-            for key, value in settings.items():
-                label_frame = ttk.Frame(scrollable_frame, style="Settings.TFrame")
-                label_frame.grid(row=row, column=0, sticky="w", padx=10, pady=5)
-                
-                ttk.Label(label_frame, text=key, 
-                    font=("Microsoft YaHei", 10),
-                    background=self.settings["主题配色"]["背景色"]
-                ).pack(side="left")
-                
-                if isinstance(value, bool):
-                    var = tk.BooleanVar(value=value)
-                    check = ttk.Checkbutton(label_frame, variable=var)
-                    check.pack(side="right")
-                    entries[category][key] = var
-                elif isinstance(value, str):
-                    if "颜色" in key:
-                        color_btn = tk.Button(label_frame, 
-                            width=8, 
-                            bg=value,
-                            command=lambda k=key, c=category: self.choose_color(k, c, entries)
-                        )
-                        color_btn.pack(side="right")
-                        entries[category][key] = color_btn
-                    else:
-                        entry = ttk.Entry(label_frame, width=20)
-                        entry.insert(0, str(value))
-                        entry.pack(side="right")
-                        entries[category][key] = entry
-                else:
-                    entry = ttk.Entry(label_frame, width=20)
-                    entry.insert(0, str(value))
-                    entry.pack(side="right")
-                    entries[category][key] = entry
-                
-                row += 1
-                
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
-            
-        def save_settings():
-            for category, category_entries in entries.items():
-                for key, entry in category_entries.items():
-                    try:
-                        if isinstance(entry, tk.BooleanVar):
-                            self.settings[category][key] = entry.get()
-                        elif isinstance(entry, tk.Button):  # 颜色按钮
-                            self.settings[category][key] = entry.cget("bg")
-                        else:
-                            # 对特定设置使用整数转换
-                            if "间隔" in key or "数量" in key or "大小" in key:
-                                self.settings[category][key] = int(float(entry.get()))
-                            else:
-                                self.settings[category][key] = float(entry.get())
-                    except ValueError:
-                        pass
-            settings_window.destroy()
-                
-        ttk.Button(settings_window, text="确定", 
-                  command=save_settings).pack(pady=10)
-        
-    def choose_color(self, key, category, entries):
-        """颜色选择器"""
-        color = tk.colorchooser.askcolor(
-            color=self.settings[category][key],
-            title="选择颜色"
-        )
-        if color[1]:
-            entries[category][key].configure(bg=color[1])
-            
-    def update_physics(self):
-        """更新节点位置的物理模拟"""
-        def update_node_recursive(node):
-            # 中心节点不受力
-            if node.parent == None or node.parent.expanded == False:
-                node.vx = 0
-                node.vy = 0
-                for child in node.children:
-                    update_node_recursive(child)
-                return
-                
-            # 计算所有节点间的排斥力
-            for other in self.get_all_nodes():
-                if other != node and other.parent and other.parent.expanded:
-                    dx = node.x - other.x
-                    dy = node.y - other.y
-                    dist = math.sqrt(dx*dx + dy*dy)
-                    if dist < self.settings["物理引擎"]["最小距离"]:
-                        dist = self.settings["物理引擎"]["最小距离"]
-                    force = self.settings["物理引擎"]["排斥力系数"] / (dist * dist)
-                    node.vx += force * dx / dist
-                    node.vy += force * dy / dist
-            
-            # 计算线之间的排斥力
-            for other_node in self.get_all_nodes():
-                if (other_node.parent and node.parent and other_node != node 
-                    and other_node.parent.expanded and node.parent.expanded):
-                    line1_mid_x = (node.x + node.parent.x) / 2
-                    line1_mid_y = (node.y + node.parent.y) / 2
-                    line2_mid_x = (other_node.x + other_node.parent.x) / 2
-                    line2_mid_y = (other_node.y + other_node.parent.y) / 2
-                    
-                    dx = line1_mid_x - line2_mid_x
-                    dy = line1_mid_y - line2_mid_y
-                    dist = math.sqrt(dx*dx + dy*dy)
-                    if dist < self.settings["物理引擎"]["最小距离"]:
-                        dist = self.settings["物理引擎"]["最小距离"]
-                    
-                    force = self.settings["物理引擎"]["线之间排斥力"] / (dist * dist)
-                    node.vx += force * dx / dist
-                    node.vy += force * dy / dist
-            
-            # 计算弹簧力
-            if node.parent:
-                dx = node.x - node.parent.x
-                dy = node.y - node.parent.y
-                dist = math.sqrt(dx*dx + dy*dy)
-                # 根据深度增加目标距离
-                target_dist = self.settings["物理引擎"]["目标距离"] * (1 + node.depth * 0.5)
-                force = self.settings["物理引擎"]["弹簧系数"] * (dist - target_dist)
-                node.vx -= force * dx / dist
-                node.vy -= force * dy / dist
-                
-                # 限制节点在其角度范围内
-                angle_range = self.get_node_angle_range(node)
-                if angle_range:
-                    start_angle, end_angle = angle_range
-                    current_angle = math.atan2(dy, dx)
-
-                    if current_angle < start_angle:
-                        current_angle = start_angle
-                    elif current_angle > end_angle:
-                        current_angle = end_angle
-                    
-                    # 根据角度计算新位置
-                    node.x = node.parent.x + dist * math.cos(current_angle)
-                    node.y = node.parent.y + dist * math.sin(current_angle)
-                    
-            # 限制最大速度
-            speed = math.sqrt(node.vx * node.vx + node.vy * node.vy)
-            if speed > self.settings["物理引擎"]["最大速度"]:
-                node.vx *= self.settings["物理引擎"]["最大速度"] / speed
-                node.vy *= self.settings["物理引擎"]["最大速度"] / speed
-                
-            # 更新速度和位置
-            node.vx *= self.settings["物理引擎"]["阻尼系数"]
-            node.vy *= self.settings["物理引擎"]["阻尼系数"]
-            node.x += node.vx
-            node.y += node.vy
-            
-            if node.expanded:
-                for child in node.children:
-                    update_node_recursive(child)
-                
-        update_node_recursive(self.root_node)
-        self.root.after(16, self.update_physics)
-        
-    def get_all_nodes(self):
-        """获取所有节点的列表"""
-        nodes = []
-        def collect_nodes(node):
-            nodes.append(node)
-            if node.expanded:
-                for child in node.children:
-                    collect_nodes(child)
-        collect_nodes(self.root_node)
-        return nodes
-        
-    def add_child_node(self):
-        """添加新的子节点"""
-        if self.selected_node:
-            text = "新主题"
-            self.create_child_node(self.selected_node, text)
-            
-    def get_node_path(self, node):
-        """获取从根节点到当前节点的路径"""
-        path = []
-        current = node
-        while current:
-            path.insert(0, current.text)
-            current = current.parent
-        return " > ".join(path)
-            
-    def llm_worker(self):
-        """LLM处理线程的工作函数"""
-        while True:
-            try:
-                node, prompt = self.llm_queue.get()
-                if node is None:  # 退出信号
-                    break
-                try:
-                    # 如果设置了包含父节点路径，则在prompt中添加路径信息
-                    if self.settings["自动生成"]["包含父节点路径"]:
-                        path = self.get_node_path(node)
-                        prompt = f"在思维导图路径'{path}'下，{prompt}"
-                        
-                    result = self.llm(prompt).strip()
-                    topics = result.split('\n')
-                    self.result_queue.put((node, topics))
-                except Exception as e:
-                    print(f"LLM错误: {e}")
-                    self.result_queue.put((node, ["新主题"]))
-            except queue.Empty:
-                continue
-                
-    def process_results(self):
-        """处理LLM结果的循环"""
-        try:
-            while not self.result_queue.empty():
-                node, topics = self.result_queue.get_nowait()
-                gen_num = int(self.settings["自动生成"]["单次生成数量"])
-                for topic in topics[:gen_num]:
-                    if topic.strip():  # 忽略空字符串
-                        self.create_child_node(node, topic.strip())
-        finally:
-            self.root.after(100, self.process_results)
-            
-    def create_child_node(self, parent_node, text):
-        """创建新的子节点"""
-        # 计算新节点的位置
-        if parent_node.children:
-            # 获取最后一个子节点的角度
-            last_child = parent_node.children[-1]
-            dx = last_child.x - parent_node.x
-            dy = last_child.y - parent_node.y
-            last_angle = math.atan2(dy, dx)
-            if last_angle < 0:
-                last_angle += 2*math.pi
-                
-            # 根据父节点的深度确定限制角度范围
-            if parent_node == self.root_node:
-                # 根节点的子节点可以在360度范围内分布
-                min_angle = 0
-                max_angle = 2*math.pi
-            else:
-                # 非根节点的子节点在120度范围内分布
-                parent_dx = parent_node.x - parent_node.parent.x
-                parent_dy = parent_node.y - parent_node.parent.y
-                parent_angle = math.atan2(parent_dy, parent_dx)
-                if parent_angle < 0:
-                    parent_angle += 2*math.pi
-                    
-                min_angle = parent_angle - math.pi/3  # 父节点角度减60度
-                max_angle = parent_angle + math.pi/3  # 父节点角度加60度
-                
-            # 计算新节点的角度，确保在限制范围内
-            angle = last_angle + math.pi/6  # 在最后一个子节点基础上增加30度
-            angle = max(min_angle, min(max_angle, angle))  # 限制在允许范围内
-        else:
-            # 第一个子节点
-            if parent_node == self.root_node:
-                angle = 0  # 根节点的第一个子节点向右
-            else:
-                # 非根节点的第一个子节点沿父节点方向
-                parent_dx = parent_node.x - parent_node.parent.x
-                parent_dy = parent_node.y - parent_node.parent.y
-                angle = math.atan2(parent_dy, parent_dx)
-            
-        # 根据深度增加距离
-        distance = self.settings["物理引擎"]["目标距离"] * (1 + parent_node.depth * 0.5)
-        
-        new_x = parent_node.x + distance * math.cos(angle)
-        new_y = parent_node.y + distance * math.sin(angle)
-        
-        new_node = MindMapNode(new_x, new_y, self.settings, text, parent_node)
-        parent_node.children.append(new_node)
-        parent_node.expanded = True  # 添加子节点时自动展开父节点
-            
-    def delete_selected_node(self, event=None):
-        """删除选中的节点及其子节点"""
-        if self.selected_node and self.selected_node != self.root_node:
-            if self.selected_node.parent:
-                self.selected_node.parent.children.remove(self.selected_node)
-            self.selected_node = None
-            
-    def toggle_auto_generate(self):
-        self.auto_generating = not self.auto_generating
-        if self.auto_generating:
-            self.start_btn.config(text="停止自动生成")
-            self.auto_gen_thread = threading.Thread(target=self.auto_generate_loop, daemon=True)
-            self.auto_gen_thread.start()
-        else:
-            self.start_btn.config(text="开始自动生成")
-            
-    def auto_generate_loop(self):
-        while self.auto_generating:
-            if self.selected_node:
-                prompt = f"基于'{self.selected_node.text}'生成{self.settings['自动生成']['单次生成数量']}个相关的子主题，每个主题一行，用换行符分隔，请直接给出主题名称，不要有任何多余文字，不要带序号"
-                self.llm_queue.put((self.selected_node, prompt))
-            threading.Event().wait(self.settings["自动生成"]["生成间隔(毫秒)"] / 1000)
-            
-    def draw(self):
-        self.canvas.delete("all")
-        
-        # 绘制网格（如果启用）
-        if self.settings["布局"]["网格显示"]:
-            grid_size = self.settings["布局"]["网格大小"] * self.scale
-            # 绘制垂直线
-            for x in range(0, int(self.canvas.winfo_width()), int(grid_size)):
-                self.canvas.create_line(x, 0, x, self.canvas.winfo_height(), fill="#EEEEEE")
-            # 绘制水平线
-            for y in range(0, int(self.canvas.winfo_height()), int(grid_size)):
-                self.canvas.create_line(0, y, self.canvas.winfo_width(), y, fill="#EEEEEE")
-
-        def draw_node_recursive(node):
-            if not node.parent or node.parent.expanded:
-                # 绘制连接线
-                if node.parent:
-                    line_style = self.settings["节点外观"]["连接线样式"]
-                    line_width = self.settings["节点外观"]["连接线粗细"]
-                    line_color = self.settings["节点外观"]["连接线颜色"]
-                    
-                    if line_style == "直线":
-                        self.canvas.create_line(
-                            self.transform_x(node.parent.x),
-                            self.transform_y(node.parent.y),
-                            self.transform_x(node.x),
-                            self.transform_y(node.y),
-                            fill=line_color,
-                            width=line_width
-                        )
-                    elif line_style == "曲线":
-                        cx = (node.x + node.parent.x) / 2
-                        cy = (node.y + node.parent.y) / 2
-                        self.canvas.create_line(
-                            self.transform_x(node.parent.x),
-                            self.transform_y(node.parent.y),
-                            self.transform_x(cx),
-                            self.transform_y(cy),
-                            self.transform_x(node.x),
-                            self.transform_y(node.y),
-                            fill=line_color,
-                            width=line_width,
-                            smooth=True
-                        )
-                    elif line_style == "折线":
-                        mid_x = (node.x + node.parent.x) / 2
-                        self.canvas.create_line(
-                            self.transform_x(node.parent.x),
-                            self.transform_y(node.parent.y),
-                            self.transform_x(mid_x),
-                            self.transform_y(node.parent.y),
-                            self.transform_x(mid_x),
-                            self.transform_y(node.y),
-                            self.transform_x(node.x),
-                            self.transform_y(node.y),
-                            fill=line_color,
-                            width=line_width
-                        )
-
-                # 绘制节点
-                x1 = self.transform_x(node.x - node.width/2)
-                y1 = self.transform_y(node.y - node.height/2)
-                x2 = self.transform_x(node.x + node.width/2)
-                y2 = self.transform_y(node.y + node.height/2)
-                
-                # 使用主题配色
-                if node == self.root_node:
-                    fill_color = self.settings["主题配色"]["根节点"]
-                else:
-                    depth_colors = [
-                        self.settings["主题配色"]["一级节点"],
-                        self.settings["主题配色"]["二级节点"],
-                        self.settings["主题配色"]["三级节点"]
-                    ]
-                    fill_color = depth_colors[min(node.depth - 1, len(depth_colors) - 1)]
-
-                if node == self.selected_node:
-                    fill_color = self.settings["主题配色"]["选中节点"]
-
-                # 绘制节点（带阴影）
-                radius = self.settings["节点外观"]["节点圆角半径"] * self.scale
-                if self.settings["节点外观"]["节点阴影"]:
-                    # 绘制阴影
-                    shadow_offset = 4 * self.scale
-                    self.canvas.create_rectangle(
-                        x1 + shadow_offset, y1 + shadow_offset,
-                        x2 + shadow_offset, y2 + shadow_offset,
-                        fill="#CCCCCC", width=0
-                    )
-
-                # 绘制圆角矩形
-                self.canvas.create_rectangle(
-                    x1+radius, y1, x2-radius, y2,
-                    fill=fill_color, width=0
-                )
-                self.canvas.create_rectangle(
-                    x1, y1+radius, x2, y2-radius,
-                    fill=fill_color, width=0
-                )
-                self.canvas.create_arc(
-                    x1, y1, x1+2*radius, y1+2*radius,
-                    start=90, extent=90, fill=fill_color, width=0
-                )
-                self.canvas.create_arc(
-                    x2-2*radius, y1, x2, y1+2*radius,
-                    start=0, extent=90, fill=fill_color, width=0
-                )
-                self.canvas.create_arc(
-                    x1, y2-2*radius, x1+2*radius, y2,
-                    start=180, extent=90, fill=fill_color, width=0
-                )
-                self.canvas.create_arc(
-                    x2-2*radius, y2-2*radius, x2, y2,
-                    start=270, extent=90, fill=fill_color, width=0
-                )
-                
-                # 设置文字大小和颜色
-                font_size = int(self.settings["节点外观"]["文字初始大小"] * self.scale * 
-                              (1 - node.depth * 0.1))
-                font_size = max(8, font_size)
-                
-                self.canvas.create_text(
-                    self.transform_x(node.x),
-                    self.transform_y(node.y),
-                    text=node.text,
-                    width=node.width * self.scale * 0.9,
-                    font=("Microsoft YaHei", font_size),
-                    fill=self.settings["主题配色"]["文字颜色"]
-                )
-                
-                # 如果有子节点，显示展开/收起按钮
-                if node.children:
-                    button_x = x2 - 15 * self.scale
-                    button_y = self.transform_y(node.y)
-                    button_size = 12 * self.scale
-                    
-                    # 绘制圆形按钮背景
-                    self.canvas.create_oval(
-                        button_x - button_size/2,
-                        button_y - button_size/2,
-                        button_x + button_size/2,
-                        button_y + button_size/2,
-                        fill="#FFFFFF",
-                        outline="#666666"
-                    )
-                    
-                    # 绘制+/-符号
-                    self.canvas.create_text(
-                        button_x,
-                        button_y,
-                        text="+" if not node.expanded else "-",
-                        font=("Microsoft YaHei", int(10 * self.scale)),
-                        fill="#666666"
-                    )
-                
-                if node.expanded:
-                    for child in node.children:
-                        draw_node_recursive(child)
-        
-        draw_node_recursive(self.root_node)
-        self.root.after(16, self.draw)
-    def transform_x(self, x):
-        return (x + self.offset_x) * self.scale
-        
-    def transform_y(self, y):
-        return (y + self.offset_y) * self.scale
-        
-    def inverse_transform_x(self, x):
-        return x / self.scale - self.offset_x
-        
-    def inverse_transform_y(self, y):
-        return y / self.scale - self.offset_y
-        
-    def find_node_at(self, x, y):
-        def check_node(node):
-            if not node.parent or node.parent.expanded:
-                tx = self.transform_x(node.x)
-                ty = self.transform_y(node.y)
-                
-                # 检查是否点击了展开/收起按钮
-                if node.children:
-                    button_x = tx + node.width/2 * self.scale - 15 * self.scale
-                    button_y = ty
-                    button_size = 12 * self.scale
-                    
-                    if (button_x - button_size/2 <= x <= button_x + button_size/2 and
-                        button_y - button_size/2 <= y <= button_y + button_size/2):
-                        node.expanded = not node.expanded
-                        return None
-                
-                if (tx - node.width/2 * self.scale <= x <= tx + node.width/2 * self.scale and
-                    ty - node.height/2 * self.scale <= y <= ty + node.height/2 * self.scale):
-                    return node
-                    
-                if node.expanded:
-                    for child in node.children:
-                        result = check_node(child)
-                        if result:
-                            return result
-            return None
-            
-        return check_node(self.root_node)
-        
-    def on_click(self, event):
-        node = self.find_node_at(event.x, event.y)
-        if node:
-            self.selected_node = node
-            self.dragging = True
-            self.drag_start_x = event.x
-            self.drag_start_y = event.y
-        else:
-            self.selected_node = None
-            self.dragging = True
-            self.drag_start_x = event.x
-            self.drag_start_y = event.y
-            
-    def on_drag(self, event):
-        if self.dragging:
-            dx = event.x - self.drag_start_x
-            dy = event.y - self.drag_start_y
-            
-            if self.selected_node:
-                self.selected_node.x += dx / self.scale
-                self.selected_node.y += dy / self.scale
-            else:
-                self.offset_x += dx / self.scale
-                self.offset_y += dy / self.scale
-                
-            self.drag_start_x = event.x
-            self.drag_start_y = event.y
-            
-    def on_release(self, event):
-        self.dragging = False
-        
-    def on_right_click(self, event):
-        node = self.find_node_at(event.x, event.y)
-        if node:
-            prompt = f"基于'{node.text}'生成{self.settings['自动生成']['单次生成数量']}个相关的子主题，每个主题一行，用换行符分隔，请直接给出主题名称，不要有任何多余文字，不要带序号"
-            self.llm_queue.put((node, prompt))
-            
-    def on_double_click(self, event):
-        node = self.find_node_at(event.x, event.y)
-        if node:
-            dialog = tk.Toplevel(self.root)
-            dialog.title("编辑节点")
-            
-            entry = ttk.Entry(dialog)
-            entry.insert(0, node.text)
-            entry.pack(padx=20, pady=20)
-            
-            def save():
-                node.text = entry.get()
-                dialog.destroy()
-                
-            ttk.Button(dialog, text="确定", command=save).pack(pady=10)
-            
-    def on_mousewheel(self, event):
-        # Windows下的滚轮事件
-        delta = event.delta / 120.0
-        
-        # 获取鼠标在画布上的坐标
-        mouse_x = event.x
-        mouse_y = event.y
-        
-        # 获取鼠标在世界坐标系中的位置
-        world_x = self.inverse_transform_x(mouse_x)
-        world_y = self.inverse_transform_y(mouse_y)
-        
-        # 更新缩放比例
-        old_scale = self.scale
-        self.scale *= (1.1 ** delta)
-        self.scale = max(0.1, min(5.0, self.scale))  # 限制缩放范围
-        
-        # 计算缩放后鼠标位置对应的世界坐标
-        new_world_x = self.inverse_transform_x(mouse_x)
-        new_world_y = self.inverse_transform_y(mouse_y)
-        
-        # 调整偏移量，使鼠标位置保持不变
-        self.offset_x += (new_world_x - world_x)
-        self.offset_y += (new_world_y - world_y)
-    def undo(self):
-        """撤销操作"""
-        if len(self.history) > 1:
-            self.future.append(self.history.pop())
-            state = self.history[-1]
-            self.root_node = MindMapNode.from_dict(copy.deepcopy(state))
-
-    def redo(self):
-        """重做操作"""
-        if self.future:
-            state = self.future.pop()
-            self.history.append(state)
-            self.root_node = MindMapNode.from_dict(copy.deepcopy(state))
-
-    def new_map(self):
-        """新建思维导图"""
-        self.root_node = MindMapNode(600, 400, self.settings, "中心主题")
-        self.root_node.expanded = True
-        self.selected_node = None
-        self.save_state()
-
-    def export_map(self):
-        """导出思维导图到文件"""
-        filename = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if filename:
-            data = self.root_node.to_dict()
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-    def import_map(self):
-        """从文件导入思维导图"""
-        filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if filename:
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.root_node = MindMapNode.from_dict(data)
-                self.selected_node = None
-                self.save_state()
-            except Exception as e:
-                tk.messagebox.showerror("错误", f"导入失败: {str(e)}")
-
-    def copy_node(self):
-        """复制选中的节点"""
-        if self.selected_node and self.selected_node != self.root_node:
-            self.clipboard = self.selected_node.to_dict()
-
-    def paste_node(self):
-        """粘贴节点"""
-        if self.clipboard and self.selected_node:
-            new_node = MindMapNode.from_dict(self.clipboard, self.selected_node)
-            self.selected_node.children.append(new_node)
-            self.selected_node.expanded = True
-            self.save_state()
-
-if __name__ == "__main__":
-    mind_map = MindMap()
-    mind_map.root.mainloop()
\ No newline at end of file
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk, filedialog, colorchooser, messagebox
+import threading
+import math
+import json
+import queue
+import sys
+import time
+import random
+import copy
+import heapq
+import re
+import zlib
+import struct
+from array import array
+import os
+import warnings
+from collections import deque, namedtuple, OrderedDict
+from tkinter import PhotoImage
+
+# 工具栏图标名称，顺序与精灵图assets/icons.png中从左到右的排列一致
+ICON_NAMES = ("start", "add", "settings", "new", "import",
+              "export", "copy", "paste", "undo", "redo")
+
+# 文字排版使用的缩放档位，缩放比例跨过一档时才重新排版文字
+TEXT_ZOOM_STEP = 1.25
+
+# 力导向模拟中所有节点每帧的屏幕位移都小于该像素数时视为已稳定，停止模拟和重绘
+SETTLE_EPSILON = 0.1
+
+class TextLayout:
+    """节点文字的字体缓存和测量缓存，需要在创建Tk窗口之后使用"""
+    FAMILY = "Microsoft YaHei"
+    MAX_MEASURES = 50000  # 测量缓存上限，超出后淘汰最久未用的条目
+    
+    def __init__(self):
+        self.fonts = {}  # 字号 -> 命名字体
+        self.measures = OrderedDict()  # (文本, 字号, 换行宽度) -> (宽, 高)
+        
+    def font(self, size):
+        """返回指定字号的命名字体，Tk不必每帧重新解析字体"""
+        font = self.fonts.get(size)
+        if font is None:
+            font = tkfont.Font(family=self.FAMILY, size=size)
+            self.fonts[size] = font
+        return font
+        
+    def measure(self, text, size, wrap_width):
+        """测量文字按wrap_width换行后的(宽, 高)"""
+        key = (text, size, wrap_width)
+        result = self.measures.get(key)
+        if result is not None:
+            self.measures.move_to_end(key)
+        else:
+            result = self._measure(text, size, wrap_width)
+            self.measures[key] = result
+            if len(self.measures) > self.MAX_MEASURES:
+                self.measures.popitem(last=False)
+        return result
+        
+    def _measure(self, text, size, wrap_width):
+        """不经缓存测量文字，按整段宽度估算行数"""
+        font = self.font(size)
+        width = 0
+        lines = 0
+        for paragraph in text.split("\n"):
+            line_width = font.measure(paragraph)
+            lines += max(1, math.ceil(line_width / wrap_width))
+            width = max(width, min(line_width, wrap_width))
+        return (width, lines * font.metrics("linespace"))
+
+class NodeSizes:
+    """按深度共享的节点尺寸表，所有节点共用一份"""
+    def __init__(self, settings, layout=None):
+        self.settings = settings
+        self.layout = layout  # 没有Tk窗口时为None，只使用按深度的尺寸
+        self.table = {}
+        self.text_sizes = OrderedDict()  # (深度, 文本) -> (宽, 高)
+        self.version = 0  # 尺寸表清空时递增，节点据此判断自身缓存的尺寸是否过期
+        
+    def get(self, depth):
+        """返回指定深度节点的(宽, 高)"""
+        size = self.table.get(depth)
+        if size is None:
+            appearance = self.settings["节点外观"]
+            # 根据深度调整节点大小
+            if depth == 0:
+                size = (appearance["根节点宽度"], appearance["根节点高度"])
+            else:
+                size = (
+                    max(appearance["子节点最小宽度"], appearance["根节点宽度"] - depth * 10),
+                    max(appearance["子节点最小高度"], appearance["根节点高度"] - depth * 5)
+                )
+            self.table[depth] = size
+        return size
+        
+    def font_size(self, depth, scale=1.0):
+        """节点文字字号，随深度递减"""
+        size = int(self.settings["节点外观"]["文字初始大小"] * scale * (1 - depth * 0.1))
+        return max(8, size)
+        
+    def size_of(self, depth, text):
+        """根据文字测量结果确定节点尺寸，长文本先加宽再增高"""
+        base = self.get(depth)
+        if self.layout is None:
+            return base
+        key = (depth, text)
+        size = self.text_sizes.get(key)
+        if size is not None:
+            self.text_sizes.move_to_end(key)
+        else:
+            base_width, base_height = base
+            # 最多加宽到两倍，文字占节点宽度的90%
+            text_width, text_height = self.layout.measure(
+                text, self.font_size(depth), base_width * 2 * 0.9)
+            size = (max(base_width, math.ceil(text_width / 0.9)),
+                    max(base_height, text_height + 10))
+            self.text_sizes[key] = size
+            if len(self.text_sizes) > TextLayout.MAX_MEASURES:
+                self.text_sizes.popitem(last=False)
+        return size
+        
+    def invalidate(self):
+        """设置修改后清空尺寸表"""
+        self.table.clear()
+        self.text_sizes.clear()
+        self.version += 1
+
+class SearchIndex:
+    """节点文本的倒排索引，以单字和相邻二字为词条，中文无需分词"""
+    def __init__(self):
+        self.postings = {}  # 词条 -> 节点集合
+        self.node_texts = {}  # 节点 -> 建索引时的文本，删除时据此重新计算词条
+        self.by_length = {}  # 文本长度 -> 节点集合，常见查询按长度从短到长扫描
+        self.pending_root = None  # 不为None时索引已过期，下次搜索前从该节点重建
+        
+    @staticmethod
+    def terms(text):
+        text = text.lower()
+        terms = set(text)
+        terms.update(text[i:i+2] for i in range(len(text) - 1))
+        return terms
+        
+    def add(self, node):
+        if self.pending_root is not None:  # 重建时会一并索引
+            return
+        self.node_texts[node] = node.text
+        self.by_length.setdefault(len(node.text), set()).add(node)
+        for term in self.terms(node.text):
+            self.postings.setdefault(term, set()).add(node)
+            
+    def remove(self, node):
+        text = self.node_texts.pop(node, None)
+        if text is None:
+            return
+        same_length = self.by_length[len(text)]
+        same_length.discard(node)
+        if not same_length:
+            del self.by_length[len(text)]
+        for term in self.terms(text):
+            nodes = self.postings.get(term)
+            if nodes is not None:
+                nodes.discard(node)
+                if not nodes:
+                    del self.postings[term]
+                    
+    def update(self, node):
+        """节点文本修改后重新建立索引"""
+        self.remove(node)
+        self.add(node)
+        
+    def add_subtree(self, root):
+        """索引整个子树，包括收起的分支"""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.add(node)
+            stack.extend(node.children)
+            
+    def remove_subtree(self, root):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.remove(node)
+            stack.extend(node.children)
+            
+    def rebuild(self, root):
+        self.invalidate(root)
+        self.pending_root = None
+        self.add_subtree(root)
+        
+    def invalidate(self, root):
+        """整棵树被替换时清空索引，推迟到下次搜索再重建，撤销重做无需等待"""
+        self.postings.clear()
+        self.node_texts.clear()
+        self.by_length.clear()
+        self.pending_root = root
+        
+    def search(self, query, limit=50):
+        """返回文本包含query的节点，较短的文本和较浅的节点排在前面"""
+        query = query.strip().lower()
+        if not query:
+            return []
+        if self.pending_root is not None:
+            self.rebuild(self.pending_root)
+        terms = {query} if len(query) == 1 else {query[i:i+2] for i in range(len(query) - 1)}
+        postings = sorted((self.postings.get(term, ()) for term in terms), key=len)
+        if not postings[0]:
+            return []
+        # 遍历最小的倒排集合，不复制也不求交集；单字和二字查询的命中即是结果，
+        # 更长的查询中二元组命中不代表连续出现，再做一次子串校验
+        smallest, others = postings[0], postings[1:]
+        
+        def matches(nodes):
+            return [node for node in nodes
+                    if all(node in posting for posting in others) and
+                    (len(query) <= 2 or query in node.text.lower())]
+            
+        def key(node):
+            return (len(node.text), node.depth)
+            
+        if len(smallest) <= 20 * limit:
+            return heapq.nsmallest(limit, matches(smallest), key=key)
+        # 命中很多时按文本长度从短到长扫描，凑够limit个结果后更长的文本不必再看
+        others = postings
+        results = []
+        for length in sorted(self.by_length):
+            if length < len(query):
+                continue
+            results.extend(matches(self.by_length[length]))
+            if len(results) >= limit:
+                break
+        return heapq.nsmallest(limit, results, key=key)
+
+class MindMapNode:
+    __slots__ = ("x", "y", "vx", "vy", "target_x", "target_y", "_text",
+                 "parent", "children", "depth", "sizes", "expanded", "_path",
+                 "_count", "_radius", "shift_x", "shift_y", "_size", "_size_version")
+    
+    def __init__(self, x, y, sizes, text="", parent=None):
+        self.x = x
+        self.y = y
+        self.vx = 0  # 速度
+        self.vy = 0
+        self.target_x = x  # 目标位置
+        self.target_y = y
+        self._path = None  # 缓存的祖先路径
+        self._count = None  # 缓存的后代数量
+        self._radius = None  # 缓存的子树包围半径
+        self.shift_x = 0  # 聚合期间尚未同步到后代的整体位移
+        self.shift_y = 0
+        self._size = None  # 缓存的(宽, 高)，与尺寸表中的元组共用
+        self._size_version = 0
+        self.text = text
+        self.parent = parent
+        self.children = []
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.sizes = sizes  # 共享的尺寸表
+        self.expanded = False # 是否展开子节点
+        
+    @property
+    def text(self):
+        return self._text
+        
+    @text.setter
+    def text(self, value):
+        # 兄弟节点、粘贴副本和历史快照中的重复文本共用同一个字符串对象
+        self._text = sys.intern(value)
+        self._size = None
+        if self._path is not None:
+            self.invalidate_path()
+            
+    def get_path(self):
+        """从根节点到当前节点的文本元组，缓存到祖先文本被修改为止"""
+        if self._path is None:
+            # 向上找到最近一个已缓存的祖先，再自顶向下补齐
+            chain = []
+            node = self
+            while node is not None and node._path is None:
+                chain.append(node)
+                node = node.parent
+            path = node._path if node is not None else ()
+            for node in reversed(chain):
+                path = path + (node._text,)
+                node._path = path
+        return self._path
+        
+    def invalidate_path(self):
+        """清除当前节点及其子树的路径缓存"""
+        # 节点有缓存时其祖先必然也有缓存，遇到未缓存的节点即可停止向下
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._path is not None:
+                node._path = None
+                stack.extend(node.children)
+        
+    def descendant_count(self):
+        """子树中的后代数量，缓存到子树结构变化为止"""
+        if self._count is None:
+            order = []
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(child for child in node.children if child._count is None)
+            for node in reversed(order):
+                node._count = sum(child._count + 1 for child in node.children)
+        return self._count
+        
+    def bounding_radius(self):
+        """后代节点到当前节点的最大距离"""
+        if self._radius is None:
+            radius = 0
+            stack = list(self.children)
+            while stack:
+                node = stack.pop()
+                radius = max(radius, math.hypot(node.x - self.x, node.y - self.y))
+                stack.extend(node.children)
+            self._radius = radius
+        return self._radius
+        
+    def refresh_radius(self, clusters=()):
+        """按当前位置自底向上刷新展开子树中各节点的包围半径，聚合节点沿用缓存"""
+        order = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.expanded and node not in clusters:
+                order.append(node)
+                stack.extend(node.children)
+        for node in reversed(order):
+            radius = 0
+            for child in node.children:
+                radius = max(radius, math.hypot(child.x - node.x, child.y - node.y) + 
+                             child.bounding_radius())
+            node._radius = radius
+        
+    def invalidate_aggregate(self):
+        """子树结构变化后清除当前节点及其祖先的聚合缓存"""
+        node = self
+        while node is not None:
+            node._count = None
+            node._radius = None
+            node = node.parent
+            
+    def move_subtree(self, dx, dy):
+        """整体平移所有后代节点"""
+        stack = list(self.children)
+        while stack:
+            node = stack.pop()
+            node.x += dx
+            node.y += dy
+            stack.extend(node.children)
+            
+    def rotate_subtree(self, cx, cy, angle):
+        """将当前节点及其后代绕(cx, cy)旋转angle弧度"""
+        cos_a, sin_a = math.cos(angle), math.sin(angle)
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            dx, dy = node.x - cx, node.y - cy
+            node.x = cx + dx * cos_a - dy * sin_a
+            node.y = cy + dx * sin_a + dy * cos_a
+            stack.extend(node.children)
+            
+    def flush_shift(self):
+        """把聚合期间累计的位移同步到后代节点"""
+        if self.shift_x or self.shift_y:
+            self.move_subtree(self.shift_x, self.shift_y)
+            self.shift_x = 0
+            self.shift_y = 0
+        
+    def size(self):
+        """节点的(宽, 高)，每帧读取时无需再查尺寸表"""
+        if self._size is None or self._size_version != self.sizes.version:
+            self._size = self.sizes.size_of(self.depth, self._text)
+            self._size_version = self.sizes.version
+        return self._size
+        
+    @property
+    def width(self):
+        return self.size()[0]
+        
+    @property
+    def height(self):
+        return self.size()[1]
+
+    def to_dict(self):
+        """将节点转换为字典格式以便序列化"""
+        return {
+            'x': self.x,
+            'y': self.y,
+            'text': self.text,
+            'expanded': self.expanded,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+    @classmethod
+    def from_dict(cls, data, sizes, parent=None):
+        """从字典创建节点"""
+        node = cls(data['x'], data['y'], sizes, data['text'], parent)
+        node.expanded = data['expanded']
+        for child_data in data['children']:
+            child = cls.from_dict(child_data, sizes, node)
+            node.children.append(child)
+        return node
+
+class MapSnapshot:
+    """撤销历史使用的扁平快照，按先序遍历顺序保存在并行数组中"""
+    __slots__ = ("xs", "ys", "texts", "parents", "expanded")
+    
+    def __init__(self, root):
+        self.xs = array('d')
+        self.ys = array('d')
+        self.texts = []
+        self.parents = array('i')  # 父节点在数组中的下标，根节点为-1
+        self.expanded = bytearray()
+        stack = [(root, -1)]
+        while stack:
+            node, parent_index = stack.pop()
+            index = len(self.texts)
+            self.xs.append(node.x)
+            self.ys.append(node.y)
+            self.texts.append(node.text)
+            self.parents.append(parent_index)
+            self.expanded.append(node.expanded)
+            for child in reversed(node.children):
+                stack.append((child, index))
+                
+    def __len__(self):
+        return len(self.texts)
+        
+    def to_node(self, sizes):
+        """根据快照重建节点树，返回根节点"""
+        nodes = []
+        for i, text in enumerate(self.texts):
+            parent_index = self.parents[i]
+            parent = nodes[parent_index] if parent_index >= 0 else None
+            node = MindMapNode(self.xs[i], self.ys[i], sizes, text, parent)
+            node.expanded = bool(self.expanded[i])
+            if parent:
+                parent.children.append(node)
+            nodes.append(node)
+        return nodes[0]
+
+def write_map_json(snapshot, f, indent=None, progress=None):
+    """按深度优先顺序把快照流式写入JSON，不构造中间的字典树"""
+    # 键的顺序和to_dict一致，保持文件格式兼容
+    key_sep, item_sep = (": ", ",") if indent else (":", ",")
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    xs, ys, texts, parents, expanded = (snapshot.xs, snapshot.ys, snapshot.texts,
+                                        snapshot.parents, snapshot.expanded)
+    
+    def newline(level):
+        return "\n" + " " * (indent * level) if indent else ""
+        
+    open_nodes = []  # 尚未闭合的祖先节点下标
+    count = len(texts)
+    for i in range(count):
+        parent_index = parents[i]
+        while open_nodes and open_nodes[-1] != parent_index:
+            open_nodes.pop()
+            level = 2 * len(open_nodes)
+            f.write(newline(level + 1) + "]" + newline(level) + "}")
+        level = 2 * len(open_nodes)
+        if parent_index >= 0:
+            # 父节点刚打开children数组时不需要逗号
+            f.write((item_sep if i - 1 != parent_index else "") + newline(level))
+        f.write("{" + newline(level + 1)
+                + '"x"' + key_sep + repr(xs[i]) + item_sep + newline(level + 1)
+                + '"y"' + key_sep + repr(ys[i]) + item_sep + newline(level + 1)
+                + '"text"' + key_sep + dumps(texts[i]) + item_sep + newline(level + 1)
+                + '"expanded"' + key_sep + ("true" if expanded[i] else "false") + item_sep
+                + newline(level + 1) + '"children"' + key_sep + "[")
+        if i + 1 < count and parents[i + 1] == i:
+            open_nodes.append(i)
+        else:
+            f.write("]" + newline(level) + "}")
+        if progress and i % 1000 == 0:
+            progress(i)
+    while open_nodes:
+        open_nodes.pop()
+        level = 2 * len(open_nodes)
+        f.write(newline(level + 1) + "]" + newline(level) + "}")
+    if progress:
+        progress(count)
+
+# 逗号和冒号只起分隔作用，和空白一起跳过；键和值按对象中的位置区分
+_JSON_TOKEN = re.compile(r'[ \t\n\r,:]*(?:([{}\[\]])|(")|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?)|(true|false|null))')
+_JSON_LITERALS = {"true": True, "false": False, "null": None}
+
+def _json_events(f, chunk_size=1 << 16):
+    """逐块读取文件并产生(事件, 值)，事件为{ } [ ] key value"""
+    buffer = f.read(chunk_size)
+    eof = not buffer
+    pos = 0
+    containers = []  # 尚未闭合的容器，"{"或"["
+    want_key = False  # 下一个字符串是否为对象的键
+    match_token = _JSON_TOKEN.match
+    while True:
+        match = match_token(buffer, pos)
+        if not eof and (match is None or len(buffer) - match.end() < 64):
+            rest = buffer[pos:].lstrip(" \t\n\r,:")
+            if match is not None or len(rest) < 64:
+                # 数字或字面量可能被块边界截断，读入下一块后重新匹配
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = rest + chunk
+                pos = 0
+                continue
+        if match is None:
+            rest = buffer[pos:].lstrip(" \t\n\r,:")
+            if rest:
+                raise ValueError(f"无效的JSON内容: {rest[:20]!r}")
+            if containers:
+                raise ValueError("JSON内容不完整")
+            return
+        symbol, quote, number, literal = match.groups()
+        pos = match.end()
+        if symbol:
+            if symbol in "{[":
+                containers.append(symbol)
+                want_key = symbol == "{"
+            else:
+                containers.pop()
+                want_key = bool(containers) and containers[-1] == "{"
+            yield symbol, None
+            continue
+        if quote:
+            quote_start = pos - 1
+            while True:
+                try:
+                    value, pos = json.decoder.scanstring(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    # 字符串被块边界截断
+                    chunk = "" if eof else f.read(chunk_size)
+                    if not chunk:
+                        raise
+                    buffer = buffer[quote_start:] + chunk
+                    quote_start = 0
+                    pos = 1
+            if want_key:
+                want_key = False
+                yield "key", value
+                continue
+        elif number:
+            value = float(number)
+        else:
+            value = _JSON_LITERALS[literal]
+        want_key = containers[-1] == "{" if containers else False
+        yield "value", value
+
+def read_map_json(f, sizes):
+    """流式解析导出的JSON并直接创建节点，返回根节点"""
+    # 节点在对象开始时创建，字段按任意顺序到达后再填入
+    root = None
+    stack = []  # 节点对象为[节点, 当前键]，children数组为节点，其余容器为None
+    for event, value in _json_events(f):
+        top = stack[-1] if stack else None
+        if event == "{":
+            if not stack:
+                root = MindMapNode(0, 0, sizes)
+                stack.append([root, None])
+            elif isinstance(top, MindMapNode):
+                child = MindMapNode(0, 0, sizes, "", top)
+                top.children.append(child)
+                stack.append([child, None])
+            else:
+                stack.append(None)
+        elif event == "[":
+            stack.append(top[0] if top and top[1] == "children" else None)
+        elif event in "}]":
+            stack.pop()
+        elif event == "key":
+            if top is not None:
+                top[1] = value
+        elif isinstance(top, list):
+            node, key = top
+            if key == "x":
+                node.x = node.target_x = value
+            elif key == "y":
+                node.y = node.target_y = value
+            elif key == "text":
+                node.text = value
+            elif key == "expanded":
+                node.expanded = bool(value)
+    if root is None:
+        raise ValueError("文件中没有思维导图")
+    return root
+
+# 一次生成请求的不可变快照，在UI线程中创建
+LLMRequest = namedtuple("LLMRequest", ["doc", "node", "prompt", "model", "max_retries",
+                                       "cache_key", "enqueued_at"])
+
+class FairQueue:
+    """按导图轮流出队的请求队列，避免一张导图占满LLM"""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.queues = {}  # 导图 -> 待处理请求
+        self.order = deque()  # 有待处理请求的导图，按轮转顺序排列
+        
+    def put(self, key, item):
+        with self.cond:
+            pending = self.queues.get(key)
+            if pending is None:
+                pending = self.queues[key] = deque()
+                self.order.append(key)
+            pending.append(item)
+            self.cond.notify()
+            
+    def get(self):
+        with self.cond:
+            while not self.order:
+                self.cond.wait()
+            key = self.order.popleft()
+            pending = self.queues[key]
+            item = pending.popleft()
+            if pending:
+                self.order.append(key)
+            else:
+                del self.queues[key]
+            return item
+            
+    def discard(self, key):
+        """丢弃某张导图所有尚未开始的请求"""
+        with self.cond:
+            if self.queues.pop(key, None) is not None:
+                self.order.remove(key)
+
+class ResponseCache:
+    """所有导图共用的短期LLM结果缓存，只用于合并几乎同时发出的相同请求"""
+    def __init__(self, max_size=256, ttl=30.0):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 键 -> (写入时间, 结果)，按写入顺序排列
+        self.max_size = max_size
+        self.ttl = ttl  # 超过该秒数的结果不再复用
+        
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            return entry[1]
+            
+    def put(self, key, topics):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic(), topics)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+class MapDocument:
+    """工作区中的一张思维导图，包括视图、撤销历史和搜索索引"""
+    def __init__(self, title, root_node):
+        self.title = title
+        self.root_node = root_node
+        self.selected_node = None
+        self.history = []
+        self.future = []
+        self.scale = 1.0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.text_scale = 1.0  # 量化后的缩放比例，用于字体和换行宽度
+        self.layout_dirty = True  # 树结构变化后需要重新计算静态布局
+        self.search_index = SearchIndex()
+        self.search_index.invalidate(root_node)  # 首次搜索时再建立索引
+        self.clusters = set()  # 上一帧作为整体模拟的节点
+        self.opened_clusters = set()  # 用户手动展开的聚合节点
+
+def _document_property(name):
+    """把属性转发到当前激活的导图"""
+    return property(lambda self: getattr(self.doc, name),
+                    lambda self, value: setattr(self.doc, name, value))
+
+def is_transient_error(error):
+    """连接失败、超时和服务过载视为可重试的错误"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    name = type(error).__name__
+    message = str(error)
+    return (any(word in name for word in ("Timeout", "Connect", "Unavailable")) or
+            "429" in message or "503" in message)
+
+class LLMMetrics:
+    """LLM请求的延迟和吞吐统计，供调度器和界面读取"""
+    def __init__(self, window=100):
+        self.lock = threading.Lock()
+        self.records = deque(maxlen=window)  # 最近的(排队, 首字, 总耗时, token数, 是否成功)
+        self.total = 0
+        self.errors = 0
+        self.retries = 0
+        
+    def record(self, queue_wait, first_token, latency, tokens, ok, attempts=1):
+        """每个生成请求记录一次，重试只计入attempts"""
+        with self.lock:
+            self.records.append((queue_wait, first_token, latency, tokens, ok))
+            self.total += 1
+            self.retries += attempts - 1
+            if not ok:
+                self.errors += 1
+                
+    def snapshot(self):
+        """返回最近窗口内的统计值，时间单位为秒"""
+        with self.lock:
+            records = list(self.records)
+            total, errors, retries = self.total, self.errors, self.retries
+        succeeded = [r for r in records if r[4]]
+        latencies = sorted(r[2] for r in succeeded)
+        busy_time = sum(latencies)
+        return {
+            "requests": total,
+            "errors": errors,
+            "retries": retries,
+            "error_rate": (len(records) - len(succeeded)) / len(records) if records else 0.0,
+            "queue_wait": sum(r[0] for r in records) / len(records) if records else 0.0,
+            "first_token": sum(r[1] for r in succeeded) / len(succeeded) if succeeded else 0.0,
+            "latency": busy_time / len(latencies) if latencies else 0.0,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            "tokens_per_second": sum(r[3] for r in succeeded) / busy_time if busy_time else 0.0,
+        }
+
+class AdaptiveLimiter:
+    """AIMD并发控制：请求顺利时逐步增加并发，出错或明显变慢时减半"""
+    def __init__(self, max_limit):
+        self.cond = threading.Condition()
+        self.max_limit = max(1, max_limit)
+        self.limit = 1.0
+        self.active = 0
+        self.baseline = None  # 观测到的最低单token耗时，缓慢上浮以适应变化
+        
+    def acquire(self):
+        with self.cond:
+            while self.active >= int(self.limit):
+                self.cond.wait()
+            self.active += 1
+            
+    def release(self, ok, cost=0.0):
+        """cost为本次请求的单token耗时"""
+        with self.cond:
+            self.active -= 1
+            if ok:
+                self.baseline = cost if self.baseline is None else min(cost, self.baseline * 1.01)
+            if ok and cost <= 2 * self.baseline:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(1.0, self.limit / 2)
+            self.cond.notify_all()
+
+# 默认设置，headless导出也会用到
+DEFAULT_SETTINGS = {
+    # 物理引擎参数
+    "物理引擎": {
+        "弹簧系数": 0.05,  # spring_k
+        "排斥力系数": 8000,  # repulsion
+        "阻尼系数": 0.8,    # damping
+        "目标距离": 250,    # target_dist
+        "线之间排斥力": 1000, # line_repulsion
+        "最大速度": 10.0,   # max_velocity
+        "最小距离": 50.0,   # min_distance
+        "线交叉排斥": False, # crossing_repulsion
+    },
+    # 节点外观
+    "节点外观": {
+        "文字初始大小": 14,  # word_size
+        "节点距离系数": 1.2, # node_distance_rate
+        "根节点宽度": 140,   # root_width
+        "根节点高度": 50,    # root_height
+        "子节点最小宽度": 100, # min_child_width
+        "子节点最小高度": 40, # min_child_height
+        "节点圆角半径": 10,  # node_radius
+        "节点阴影": True,   # node_shadow
+        "连接线粗细": 2,    # line_width
+        "连接线颜色": "#666666", # line_color
+        "连接线样式": "曲线", # line_style: 直线/曲线/折线
+    },
+    # 自动生成参数
+    "自动生成": {
+        "生成间隔(毫秒)": 5000,  # auto_gen_interval
+        "单次生成数量": 8,      # gen_num
+        "包含父节点路径": True,   # include_parent_path
+        "模型名称": "llama3.1:8b", # model
+        "最大并发数": 4,       # max_concurrency
+        "最大重试次数": 3,      # max_retries
+        "最大生成深度": 5,      # max_depth
+        "智能排序": True,      # smart_sort
+    },
+    # 布局参数
+    "布局": {
+        "最小缩放比例": 0.2,     # min_scale
+        "最大缩放比例": 5.0,     # max_scale
+        "子节点角度范围": 120,   # child_angle_range
+        "聚合阈值": 50,       # cluster_min_descendants
+        "聚合屏幕半径": 150,   # cluster_screen_radius
+        "布局模式": "力导向",   # layout_mode: 力导向/径向
+        "自动居中": True,      # auto_center
+        "动画速度": 1.0,      # animation_speed
+        "网格显示": False,    # show_grid
+        "网格大小": 50,      # grid_size
+    },
+    # 主题配色
+    "主题配色": {
+        "背景色": "#FFFFFF",    # background_color
+        "根节点": "#E3F2FD",    # root_color
+        "一级节点": "#BBDEFB",  # level1_color
+        "二级节点": "#90CAF9",  # level2_color
+        "三级节点": "#64B5F6",  # level3_color
+        "选中节点": "#81D4FA",  # selected_color
+        "文字颜色": "#333333",  # text_color
+        "按钮颜色": "#2196F3",  # button_color
+    },
+    # 图片导出
+    "导出": {
+        "图片DPI": 192,        # export_dpi
+        "分块大小": 1024,      # tile_size
+        "渲染进程数": 1,       # render_processes
+        "缩进JSON": False,     # indent_json
+        "字体路径": "",        # font_path，为空时在常见中文字体中查找
+    }
+}
+
+def collect_render_items(root, selected=None):
+    """收集可见节点的绘制数据，结果只含基本类型，可传给子进程"""
+    items = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        parent = node.parent
+        button = 0  # 0: 无子节点, 1: 收起, 2: 展开
+        if node.children:
+            button = 2 if node.expanded else 1
+        items.append((
+            node.x, node.y, node.width, node.height, node.depth, node.text,
+            parent.x if parent else None, parent.y if parent else None,
+            button, node == selected
+        ))
+        if node.expanded:
+            stack.extend(reversed(node.children))
+    return items
+
+def _item_bounds(item, sizes):
+    """节点、文字及连接线的世界坐标包围盒，sizes提供导出字体的文字测量"""
+    x, y, width, height, depth, text, px, py = item[:8]
+    # 画布上测量的节点尺寸可能容纳不下导出字体排版的文字
+    text_width, text_height = sizes.layout.measure(text, sizes.font_size(depth), width * 0.9)
+    half_width = max(width, text_width) / 2
+    half_height = max(height, text_height) / 2
+    x1, y1 = x - half_width, y - half_height
+    x2, y2 = x + half_width + 4, y + half_height + 4  # 包括阴影
+    if px is not None:
+        x1, y1 = min(x1, px), min(y1, py)
+        x2, y2 = max(x2, px), max(y2, py)
+    return x1, y1, x2, y2
+
+_FONT_CANDIDATES = ("msyh.ttc", "msyh.ttf", "simhei.ttf", "PingFang.ttc",
+                    "NotoSansCJK-Regular.ttc", "wqy-microhei.ttc", "Arial Unicode.ttf")
+_font_cache = {}
+
+def _load_font(size, path=""):
+    """加载支持中文的字体，优先使用path指定的字体，找不到时退回Pillow默认字体并给出警告"""
+    font = _font_cache.get((path, size))
+    if font is None:
+        from PIL import ImageFont
+        for name in ((path,) if path else ()) + _FONT_CANDIDATES:
+            try:
+                font = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                if name == path:
+                    warnings.warn(f"无法加载字体 {path}，改用系统中的中文字体")
+        else:
+            warnings.warn("未找到中文字体，导出图片中的中文将无法显示；"
+                          "请在导出设置的字体路径中指定字体文件，或使用--font参数")
+            try:
+                font = ImageFont.load_default(size)
+            except TypeError:  # Pillow 10.1之前不支持字号
+                font = ImageFont.load_default()
+        _font_cache[(path, size)] = font
+    return font
+
+def _line_height(font):
+    """导出图片中一行文字的高度"""
+    bbox = font.getbbox("国Ag")
+    return bbox[3] - bbox[1] + 2
+
+# 换行单位：连续的非中日韩字符（英文单词连同标点）或单个字符，各自带上后面的空白
+_WRAP_TOKEN = re.compile(r"[^\s\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]+\s*|\S\s*|\s+")
+
+def _wrap_text(text, font, width):
+    """按像素宽度换行，英文在单词之间断行，中文逐字断行，放不下一行的长单词逐字断开"""
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for token in _WRAP_TOKEN.findall(paragraph):
+            if line and font.getlength(line + token.rstrip()) > width:
+                lines.append(line.rstrip())
+                line = ""
+                token = token.lstrip()
+            if font.getlength(token.rstrip()) <= width:
+                line += token
+                continue
+            for char in token:
+                if line and font.getlength(line + char) > width:
+                    lines.append(line.rstrip())
+                    line = char
+                else:
+                    line += char
+        lines.append(line.rstrip())
+    return lines
+
+class PillowTextLayout(TextLayout):
+    """没有Tk窗口时用Pillow字体测量文字，换行规则与导出图片一致"""
+    def __init__(self, font_path=""):
+        super().__init__()
+        self.font_path = font_path
+        
+    def font(self, size):
+        return _load_font(size, self.font_path)
+        
+    def _measure(self, text, size, wrap_width):
+        font = self.font(size)
+        lines = _wrap_text(text, font, wrap_width)
+        width = max(font.getlength(line) for line in lines)
+        return (math.ceil(width), len(lines) * _line_height(font))
+
+def _render_tile(task):
+    """渲染一个分块，返回RGB像素数据；在子进程中运行时只依赖参数"""
+    from PIL import Image, ImageDraw
+    items, settings, scale, origin_x, origin_y, tile_width, tile_height = task
+    appearance = settings["节点外观"]
+    theme = settings["主题配色"]
+    image = Image.new("RGB", (tile_width, tile_height), theme["背景色"])
+    draw = ImageDraw.Draw(image)
+    
+    def tx(x):
+        return (x - origin_x) * scale
+        
+    def ty(y):
+        return (y - origin_y) * scale
+        
+    line_width = max(1, round(appearance["连接线粗细"] * scale))
+    # 先画所有连接线，再画节点，与画布的层次一致
+    for x, y, _, _, _, _, px, py, _, _ in items:
+        if px is None:
+            continue
+        if appearance["连接线样式"] == "折线":
+            mid_x = (x + px) / 2
+            points = [(tx(px), ty(py)), (tx(mid_x), ty(py)), (tx(mid_x), ty(y)), (tx(x), ty(y))]
+        else:
+            points = [(tx(px), ty(py)), (tx(x), ty(y))]
+        draw.line(points, fill=appearance["连接线颜色"], width=line_width)
+        
+    depth_colors = [theme["一级节点"], theme["二级节点"], theme["三级节点"]]
+    radius = appearance["节点圆角半径"] * scale
+    for x, y, width, height, depth, text, _, _, button, selected in items:
+        x1, y1 = tx(x - width / 2), ty(y - height / 2)
+        x2, y2 = tx(x + width / 2), ty(y + height / 2)
+        if selected:
+            fill_color = theme["选中节点"]
+        elif depth == 0:
+            fill_color = theme["根节点"]
+        else:
+            fill_color = depth_colors[min(depth - 1, len(depth_colors) - 1)]
+        if appearance["节点阴影"]:
+            shadow_offset = 4 * scale
+            draw.rectangle((x1 + shadow_offset, y1 + shadow_offset,
+                            x2 + shadow_offset, y2 + shadow_offset), fill="#CCCCCC")
+        draw.rounded_rectangle((x1, y1, x2, y2), radius=radius, fill=fill_color)
+        
+        font_size = max(8, int(appearance["文字初始大小"] * scale * (1 - depth * 0.1)))
+        font = _load_font(font_size, settings["导出"]["字体路径"])
+        lines = _wrap_text(text, font, (x2 - x1) * 0.9)
+        bbox = font.getbbox("国Ag")
+        line_height = _line_height(font)
+        top = (y1 + y2) / 2 - line_height * len(lines) / 2
+        for i, line in enumerate(lines):
+            left = (x1 + x2) / 2 - draw.textlength(line, font=font) / 2
+            draw.text((left, top + i * line_height - bbox[1]), line, font=font, fill=theme["文字颜色"])
+            
+        # 展开/收起按钮
+        if button:
+            button_x = x2 - 15 * scale
+            button_y = (y1 + y2) / 2
+            button_size = 12 * scale
+            draw.ellipse((button_x - button_size / 2, button_y - button_size / 2,
+                          button_x + button_size / 2, button_y + button_size / 2),
+                         fill="#FFFFFF", outline="#666666")
+            sign = "-" if button == 2 else "+"
+            sign_font = _load_font(max(8, int(10 * scale)), settings["导出"]["字体路径"])
+            sign_box = draw.textbbox((0, 0), sign, font=sign_font)
+            draw.text((button_x - (sign_box[0] + sign_box[2]) / 2, button_y - (sign_box[1] + sign_box[3]) / 2),
+                      sign, font=sign_font, fill="#666666")
+    return image.tobytes()
+
+class PNGStreamWriter:
+    """逐行写入PNG文件，内存占用与图片高度无关"""
+    def __init__(self, f, width, height, dpi):
+        self.f = f
+        self.width = width
+        self.compressor = zlib.compressobj(6)
+        self.pending = bytearray()
+        f.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        pixels_per_meter = round(dpi / 0.0254)
+        self.write_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+        
+    def write_chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+        
+    def write_row(self, row):
+        """写入一行RGB像素，每行前加过滤类型0"""
+        self.pending += self.compressor.compress(b"\x00" + row)
+        if len(self.pending) >= 1 << 16:
+            self.write_chunk(b"IDAT", bytes(self.pending))
+            self.pending.clear()
+            
+    def close(self):
+        self.pending += self.compressor.flush()
+        self.write_chunk(b"IDAT", bytes(self.pending))
+        self.write_chunk(b"IEND", b"")
+
+def render_png(items, settings, filename, dpi=192, tile_size=1024, processes=1, margin=20):
+    """离屏分块渲染为PNG，每次只在内存中保留约一个分块大小的横条"""
+    scale = dpi / 96
+    sizes = NodeSizes(settings, PillowTextLayout(settings["导出"]["字体路径"]))
+    bounds = [_item_bounds(item, sizes) for item in items]
+    min_x = min(b[0] for b in bounds) - margin
+    min_y = min(b[1] for b in bounds) - margin
+    max_x = max(b[2] for b in bounds) + margin
+    max_y = max(b[3] for b in bounds) + margin
+    width = max(1, math.ceil((max_x - min_x) * scale))
+    height = max(1, math.ceil((max_y - min_y) * scale))
+    columns = math.ceil(width / tile_size)
+    rows = math.ceil(height / tile_size)
+    
+    # 按包围盒把节点分配到覆盖的分块中，每个分块只绘制相关节点
+    buckets = {}
+    for item, (x1, y1, x2, y2) in zip(items, bounds):
+        col1 = max(0, int((x1 - min_x) * scale // tile_size))
+        col2 = min(columns - 1, int((x2 - min_x) * scale // tile_size))
+        row1 = max(0, int((y1 - min_y) * scale // tile_size))
+        row2 = min(rows - 1, int((y2 - min_y) * scale // tile_size))
+        for row in range(row1, row2 + 1):
+            for col in range(col1, col2 + 1):
+                buckets.setdefault((row, col), []).append((item, y1, y2))
+                
+    executor = None
+    if processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(processes)
+    try:
+        with open(filename, "wb") as f:
+            writer = PNGStreamWriter(f, width, height, dpi)
+            # 图片越宽横条越矮，同时在内存中的像素总数不超过一个分块
+            band_size = max(1, tile_size // columns)
+            y = 0
+            while y < height:
+                row = y // tile_size
+                band_height = min(band_size, height - y, (row + 1) * tile_size - y)
+                top = min_y + y / scale
+                bottom = min_y + (y + band_height) / scale
+                tasks = []
+                for col in range(columns):
+                    tasks.append((
+                        [item for item, y1, y2 in buckets.get((row, col), [])
+                         if y1 <= bottom and y2 >= top],
+                        settings, scale, min_x + col * tile_size / scale, top,
+                        min(tile_size, width - col * tile_size), band_height
+                    ))
+                tiles = list(executor.map(_render_tile, tasks) if executor else map(_render_tile, tasks))
+                # 拼接同一横条各列的像素后逐行写入
+                for line in range(band_height):
+                    row_data = b"".join(
+                        tile[line * task[5] * 3:(line + 1) * task[5] * 3] for tile, task in zip(tiles, tasks))
+                    writer.write_row(row_data)
+                y += band_height
+            writer.close()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return width, height
+
+class MindMap:
+    # 以下状态属于当前激活的导图
+    root_node = _document_property("root_node")
+    selected_node = _document_property("selected_node")
+    history = _document_property("history")
+    future = _document_property("future")
+    scale = _document_property("scale")
+    offset_x = _document_property("offset_x")
+    offset_y = _document_property("offset_y")
+    text_scale = _document_property("text_scale")
+    layout_dirty = _document_property("layout_dirty")
+    search_index = _document_property("search_index")
+    clusters = _document_property("clusters")
+    opened_clusters = _document_property("opened_clusters")
+    
+    def __init__(self):
+        self.settings = copy.deepcopy(DEFAULT_SETTINGS)
+        self.root = tk.Tk()
+        self.root.title("思维导图生成器")
+        self.root.geometry("1200x800")
+        
+        # 设置主题样式
+        style = ttk.Style()
+        style.theme_use('clam')
+        
+        # 自定义颜色和样式
+        style.configure("TButton",
+            padding=8,
+            relief="flat",
+            background=self.settings["主题配色"]["按钮颜色"],
+            foreground="white",
+            font=("Microsoft YaHei", 10, "bold"),
+            borderwidth=0
+        )
+        
+        style.map("TButton",
+            background=[('active', '#1976D2'), ('pressed', '#0D47A1')],
+            foreground=[('active', 'white'), ('pressed', 'white')]
+        )
+        
+        style.configure("TEntry",
+            padding=8,
+            relief="flat",
+            font=("Microsoft YaHei", 10),
+            fieldbackground="#F5F5F5",
+            borderwidth=1
+        )
+        
+        style.configure("Toolbar.TFrame",
+            background=self.settings["主题配色"]["背景色"],
+            relief="raised",
+            borderwidth=1
+        )
+        
+        # 图标在首帧绘制后再加载
+        for name in ICON_NAMES:
+            setattr(self, f"{name}_icon", None)
+        self.icon_buttons = {}
+        
+        # LLM在第一次生成请求时才创建
+        self.llms = {}  # 模型名称 -> Ollama客户端
+        self.llm_lock = threading.Lock()
+        self.llm_metrics = LLMMetrics()
+        self.llm_limiter = None
+        
+        # 用于线程间通信的队列
+        self.llm_queue = FairQueue()
+        self.result_queue = queue.Queue()
+        self.response_cache = ResponseCache()
+        
+        # LLM处理线程在第一次生成请求时启动
+        self.llm_threads = []
+        
+        # 创建主框架
+        self.main_frame = ttk.Frame(self.root)
+        self.main_frame.pack(fill="both", expand=True)
+        
+        # 工具栏
+        self.toolbar = ttk.Frame(self.main_frame, style="Toolbar.TFrame")
+        self.toolbar.pack(side="top", fill="x", padx=10, pady=5)
+
+        # 文件操作按钮
+        self.file_frame = ttk.Frame(self.toolbar)
+        self.file_frame.pack(side="left", padx=5)
+        
+        for name, text, command in (("new", "新建", self.new_map),
+                                    ("import", "导入", self.import_map),
+                                    ("export", "导出", self.export_map)):
+            button = ttk.Button(self.file_frame, text=text, compound="left", command=command)
+            button.pack(side="left", padx=2)
+            self.icon_buttons[name] = button
+        ttk.Button(self.file_frame, text="关闭", command=self.close_map).pack(side="left", padx=2)
+        
+        # 编辑操作按钮
+        self.edit_frame = ttk.Frame(self.toolbar)
+        self.edit_frame.pack(side="left", padx=5)
+        
+        for name, text, command in (("copy", "复制", self.copy_node),
+                                    ("paste", "粘贴", self.paste_node),
+                                    ("undo", "撤销", self.undo),
+                                    ("redo", "重做", self.redo)):
+            button = ttk.Button(self.edit_frame, text=text, compound="left", command=command)
+            button.pack(side="left", padx=2)
+            self.icon_buttons[name] = button
+        
+        # 原有按钮
+        self.start_btn = ttk.Button(self.toolbar, 
+            text="开始自动生成",
+            command=self.toggle_auto_generate,
+            compound="left"
+        )
+        self.start_btn.pack(side="left", padx=5)
+        self.icon_buttons["start"] = self.start_btn
+        
+        self.add_btn = ttk.Button(self.toolbar,
+            text="新建子节点",
+            command=self.add_child_node,
+            compound="left"
+        )
+        self.add_btn.pack(side="left", padx=5)
+        self.icon_buttons["add"] = self.add_btn
+        
+        self.settings_btn = ttk.Button(self.toolbar,
+            text="设置",
+            command=self.show_settings,
+            compound="left"
+        )
+        self.settings_btn.pack(side="left", padx=5)
+        self.icon_buttons["settings"] = self.settings_btn
+        
+        self.layout_btn = ttk.Button(self.toolbar,
+            text="整理布局",
+            command=self.apply_layout
+        )
+        self.layout_btn.pack(side="left", padx=5)
+        
+        # 搜索框
+        self.search_frame = ttk.Frame(self.toolbar)
+        self.search_frame.pack(side="right", padx=5)
+        self.search_entry = ttk.Entry(self.search_frame, width=20)
+        self.search_entry.pack(side="left", padx=2)
+        self.search_entry.bind("<Return>", lambda e: self.show_search_results())
+        ttk.Button(self.search_frame, text="搜索", command=self.show_search_results).pack(side="left", padx=2)
+        self.search_window = None
+        
+        # LLM状态
+        self.llm_status = ttk.Label(self.toolbar, text="", font=("Microsoft YaHei", 9))
+        self.llm_status.pack(side="right", padx=5)
+        
+        # 导图标签页，所有导图共用下方的画布
+        self.tabs = ttk.Notebook(self.main_frame)
+        self.tabs.pack(side="top", fill="x", padx=10)
+        self.tabs.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.tab_documents = {}  # 标签页 -> 导图
+        self.documents = []
+        
+        # 画布容器
+        self.canvas_frame = ttk.Frame(self.main_frame)
+        self.canvas_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        # 画布
+        self.canvas = tk.Canvas(
+            self.canvas_frame,
+            width=1200,
+            height=800,
+            bg=self.settings["主题配色"]["背景色"],
+            highlightthickness=0
+        )
+        self.canvas.pack(fill="both", expand=True)
+        
+        # 滚动条
+        self.h_scrollbar = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.canvas.xview)
+        self.v_scrollbar = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(xscrollcommand=self.h_scrollbar.set, yscrollcommand=self.v_scrollbar.set)
+        
+        self.h_scrollbar.pack(side="bottom", fill="x")
+        self.v_scrollbar.pack(side="right", fill="y")
+        
+        self.redraw_job = None
+        
+        # 节点数据
+        self.text_layout = TextLayout()
+        self.node_sizes = NodeSizes(self.settings, self.text_layout)
+        self.dragging = False
+        self.auto_generating = False
+        self.auto_gen_job = None
+        self.needs_redraw = True  # 画面内容变化后才重新绘制
+        self.settled = False  # 力导向模拟已稳定，画面再次变化前不再计算
+        self.map_counter = 0
+        self.new_map()
+        
+        # 复制粘贴相关，所有导图共用
+        self.clipboard = None
+        
+        # 绑定事件
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Button-3>", self.on_right_click)
+        self.canvas.bind("<Double-Button-1>", self.on_double_click)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Configure>", lambda e: setattr(self, "needs_redraw", True))
+        self.root.bind("<Delete>", self.delete_selected_node)
+        self.root.bind("<Control-c>", lambda e: self.copy_node())
+        self.root.bind("<Control-v>", lambda e: self.paste_node())
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
+        
+        # 启动物理模拟和绘制循环
+        self.update_physics()
+        self.draw()
+        
+        # 工作线程产生结果后通过虚拟事件唤醒主循环
+        self.root.bind("<<LLMResult>>", lambda e: self.process_results())
+        
+        # 首帧绘制完成后再加载图标
+        self.root.after_idle(lambda: self.root.after(0, self.load_icons))
+
+    def load_icons(self):
+        """加载工具栏图标，优先从精灵图中裁剪"""
+        icons = {}
+        try:
+            sheet = PhotoImage(file="assets/icons.png")
+            size = sheet.height()
+            for i, name in enumerate(ICON_NAMES):
+                icon = PhotoImage()
+                icon.tk.call(icon, "copy", sheet, "-from", i * size, 0, (i + 1) * size, size,
+                             "-subsample", 2, 2)
+                icons[name] = icon
+        except tk.TclError:
+            for name in ICON_NAMES:
+                try:
+                    icons[name] = PhotoImage(file=f"assets/{name}.png").subsample(2,2)
+                except tk.TclError:
+                    pass
+        for name, icon in icons.items():
+            setattr(self, f"{name}_icon", icon)
+            self.icon_buttons[name].configure(image=icon)
+            
+    def get_llm(self, model):
+        """第一次使用时才导入langchain并创建Ollama客户端"""
+        with self.llm_lock:
+            if model not in self.llms:
+                from langchain.llms import Ollama
+                from langchain.callbacks.manager import CallbackManager
+                from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+                callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
+                self.llms[model] = Ollama(
+                    model=model,
+                    callback_manager=callback_manager
+                )
+            return self.llms[model]
+            
+    def ensure_llm_worker(self):
+        """第一次生成请求时按最大并发数启动LLM处理线程"""
+        if not self.llm_threads:
+            max_concurrency = int(self.settings["自动生成"]["最大并发数"])
+            self.llm_limiter = AdaptiveLimiter(max_concurrency)
+            for _ in range(max(1, max_concurrency)):
+                thread = threading.Thread(target=self.llm_worker, daemon=True)
+                thread.start()
+                self.llm_threads.append(thread)
+            self.update_llm_status()
+            
+    def get_llm_metrics(self):
+        """当前LLM统计数据，附带并发上限和正在执行的请求数"""
+        metrics = self.llm_metrics.snapshot()
+        limiter = self.llm_limiter
+        metrics["concurrency"] = int(limiter.limit) if limiter else 0
+        metrics["active"] = limiter.active if limiter else 0
+        return metrics
+        
+    def update_llm_status(self):
+        """每秒刷新工具栏上的LLM状态"""
+        metrics = self.get_llm_metrics()
+        self.llm_status.config(text=(
+            f"并发 {metrics['active']}/{metrics['concurrency']} | "
+            f"排队 {metrics['queue_wait']:.1f}s | 首字 {metrics['first_token']:.1f}s | "
+            f"耗时 {metrics['latency']:.1f}s | {metrics['tokens_per_second']:.1f} tok/s | "
+            f"错误 {metrics['error_rate']:.0%} | 重试 {metrics['retries']}"
+        ))
+        self.root.after(1000, self.update_llm_status)
+
+    def get_node_angle_range(self, node):
+        """计算节点相对根节点方向的允许范围，与径向布局的扇区定义一致"""
+        if not node.parent:
+            return (-2*math.pi, 2*math.pi)
+            
+        # 如果父节点是根节点,则无限制
+        if node.parent.parent is None:
+            return (-2*math.pi, 2*math.pi)
+            
+        # 计算父节点相对于根节点的角度
+        dx = node.parent.x - self.root_node.x
+        dy = node.parent.y - self.root_node.y
+        parent_angle = math.atan2(dy, dx)
+            
+        # 基于父节点角度,限制在设定范围内
+        half_range = math.pi * self.settings["布局"]["子节点角度范围"]/360
+        min_angle = (parent_angle - half_range)
+        max_angle = (parent_angle + half_range)
+        
+        return (min_angle, max_angle)
+    def save_state(self, doc=None):
+        """保存导图的当前状态到其历史记录，默认为当前导图"""
+        doc = doc or self.doc
+        state = MapSnapshot(doc.root_node)
+        doc.history.append(state)
+        doc.future.clear()  # 清空重做历史
+        if len(doc.history) > 50:  # 限制历史记录数量
+            doc.history.pop(0)
+    def show_settings(self):
+        settings_window = tk.Toplevel(self.root)
+        settings_window.title("设置")
+        settings_window.geometry("600x800")
+        
+        style = ttk.Style()
+        style.configure("Settings.TNotebook", 
+            background=self.settings["主题配色"]["背景色"],
+            borderwidth=0
+        )
+        style.configure("Settings.TFrame",
+            background=self.settings["主题配色"]["背景色"]
+        )
+        
+        notebook = ttk.Notebook(settings_window, style="Settings.TNotebook")
+        notebook.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        entries = {}
+        
+        # 为每个分类创建一个标签页
+        for category, settings in self.settings.items():
+            frame = ttk.Frame(notebook, style="Settings.TFrame")
+            notebook.add(frame, text=category)
+            
+            canvas = tk.Canvas(frame, background=self.settings["主题配色"]["背景色"])
+            scrollbar = ttk.Scrollbar(frame, orient="vertical", command=canvas.yview)
+            scrollable_frame = ttk.Frame(canvas, style="Settings.TFrame")
+            
+            scrollable_frame.bind(
+                "<Configure>",
+                lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+            )
+            
+            canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+            canvas.configure(yscrollcommand=scrollbar.set)
+            
+            entries[category] = {}
+            row = 0
+            for key, value in settings.items():
+                label_frame = ttk.Frame(scrollable_frame, style="Settings.TFrame")
+                label_frame.grid(row=row, column=0, sticky="w", padx=10, pady=5)
+                
+                ttk.Label(label_frame, text=key, 
+                    font=("Microsoft YaHei", 10),
+                    background=self.settings["主题配色"]["背景色"]
+                ).pack(side="left")
+                
+                if isinstance(value, bool):
+                    var = tk.BooleanVar(value=value)
+                    check = ttk.Checkbutton(label_frame, variable=var)
+                    check.pack(side="right")
+                    entries[category][key] = var
+                elif isinstance(value, str):
+                    if "颜色" in key:
+                        color_btn = tk.Button(label_frame, 
+                            width=8, 
+                            bg=value,
+                            command=lambda k=key, c=category: self.choose_color(k, c, entries)
+                        )
+                        color_btn.pack(side="right")
+                        entries[category][key] = color_btn
+                    else:
+                        entry = ttk.Entry(label_frame, width=20)
+                        entry.insert(0, str(value))
+                        entry.pack(side="right")
+                        entries[category][key] = entry
+                else:
+                    entry = ttk.Entry(label_frame, width=20)
+                    entry.insert(0, str(value))
+                    entry.pack(side="right")
+                    entries[category][key] = entry
+                
+                row += 1
+                
+            canvas.pack(side="left", fill="both", expand=True)
+            scrollbar.pack(side="right", fill="y")
+            
+        def save_settings():
+            for category, category_entries in entries.items():
+                for key, entry in category_entries.items():
+                    try:
+                        if isinstance(entry, tk.BooleanVar):
+                            self.settings[category][key] = entry.get()
+                        elif isinstance(entry, tk.Button):  # 颜色按钮
+                            self.settings[category][key] = entry.cget("bg")
+                        else:
+                            # 对特定设置使用整数转换
+                            if isinstance(self.settings[category][key], str):
+                                self.settings[category][key] = entry.get()
+                            elif "间隔" in key or "数量" in key or "大小" in key:
+                                self.settings[category][key] = int(float(entry.get()))
+                            else:
+                                self.settings[category][key] = float(entry.get())
+                    except ValueError:
+                        pass
+            self.node_sizes.invalidate()
+            self.layout_dirty = True
+            self.needs_redraw = True
+            settings_window.destroy()
+                
+        ttk.Button(settings_window, text="确定", 
+                  command=save_settings).pack(pady=10)
+        
+    def choose_color(self, key, category, entries):
+        """颜色选择器"""
+        color = tk.colorchooser.askcolor(
+            color=self.settings[category][key],
+            title="选择颜色"
+        )
+        if color[1]:
+            entries[category][key].configure(bg=color[1])
+            
+    def compute_radial_layout(self):
+        """按子树权重一次性计算径向布局，结果写入target_x/target_y"""
+        angle_range = math.pi * self.settings["布局"]["子节点角度范围"] / 180
+        base_dist = self.settings["物理引擎"]["目标距离"]
+        
+        # 先序收集可见节点，逆序累计子树权重（可见叶子数）
+        order = []
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node.expanded:
+                stack.extend(node.children)
+        weights = {}
+        for node in reversed(order):
+            if node.expanded and node.children:
+                weights[node] = sum(weights[child] for child in node.children)
+            else:
+                weights[node] = 1
+        
+        # 自顶向下分配以根节点为圆心的扇区：根节点占满360度，其余节点不超过子节点角度范围
+        root = self.root_node
+        root.target_x = root.x
+        root.target_y = root.y
+        angles = {}
+        ring_min = {}  # 每层圆环的最小半径，保证扇区弧长容纳节点宽度
+        gap = self.settings["物理引擎"]["最小距离"]
+        stack = [(root, 0.0, 2*math.pi)]
+        while stack:
+            node, direction, sector = stack.pop()
+            if not (node.expanded and node.children):
+                continue
+            span = 2*math.pi if node.parent is None else min(sector, angle_range)
+            start = direction - span / 2
+            total = weights[node]
+            for child in node.children:
+                share = span * weights[child] / total
+                angle = start + share / 2
+                start += share
+                angles[child] = angle
+                ring_min[child.depth] = max(ring_min.get(child.depth, 0),
+                                            (child.width + gap) / share)
+                stack.append((child, angle, share))
+                
+        # 同层节点位于同一圆环上，间距与弹簧力的目标距离保持一致
+        radii = [0]
+        for depth in range(1, max(ring_min, default=0) + 1):
+            radii.append(max(radii[-1] + base_dist * (1 + depth * 0.5), ring_min[depth]))
+        for node, angle in angles.items():
+            radius = radii[node.depth]
+            node.target_x = root.target_x + radius * math.cos(angle)
+            node.target_y = root.target_y + radius * math.sin(angle)
+        self.layout_dirty = False
+        
+    def apply_layout(self):
+        """立即将节点放到静态布局位置，可作为力导向模拟的初始状态"""
+        self.compute_radial_layout()
+        nodes = self.get_all_nodes()
+        for node in nodes:
+            node.flush_shift()
+        for node in nodes:
+            if not node.expanded and node.children:
+                # 收起的子树随节点整体移动
+                node.move_subtree(node.target_x - node.x, node.target_y - node.y)
+            node.x = node.target_x
+            node.y = node.target_y
+            node.vx = 0
+            node.vy = 0
+        self.root_node.refresh_radius()  # 节点已在新位置，旧的包围半径不再有效
+        self.needs_redraw = True
+            
+    def animate_to_targets(self, nodes):
+        """径向布局模式下让节点平滑移动到目标位置，返回是否有节点移动"""
+        moved = False
+        rate = min(1.0, 0.15 * self.settings["布局"]["动画速度"])
+        for node in nodes:
+            if node.parent is None or (self.dragging and node == self.selected_node):
+                continue
+            dx = (node.target_x - node.x) * rate
+            dy = (node.target_y - node.y) * rate
+            if abs(dx) > 0.01 or abs(dy) > 0.01:
+                self.needs_redraw = True
+                moved = True
+            node.x += dx
+            node.y += dy
+            node.vx = 0
+            node.vy = 0
+            if node in self.clusters:
+                node.shift_x += dx  # 子树随聚合节点整体移动
+                node.shift_y += dy
+        return moved
+            
+    def edge_cutoff_radius(self):
+        """线排斥力的截断半径，超出该距离的连线之间不再计算排斥"""
+        return max(self.settings["物理引擎"]["目标距离"], 
+                   4 * self.settings["物理引擎"]["最小距离"])
+        
+    def build_edge_grid(self, nodes, cell_size):
+        """以连线中点建立空间哈希，键为网格坐标"""
+        grid = {}
+        for node in nodes:
+            if node.parent:
+                mid_x = (node.x + node.parent.x) / 2
+                mid_y = (node.y + node.parent.y) / 2
+                key = (int(mid_x // cell_size), int(mid_y // cell_size))
+                grid.setdefault(key, []).append((node, mid_x, mid_y))
+        return grid
+        
+    def build_edge_box_grid(self, nodes, cell_size):
+        """按连线包围盒覆盖的网格建立空间哈希，用于交叉检测"""
+        grid = {}
+        for node in nodes:
+            if node.parent:
+                x1 = int(min(node.x, node.parent.x) // cell_size)
+                x2 = int(max(node.x, node.parent.x) // cell_size)
+                y1 = int(min(node.y, node.parent.y) // cell_size)
+                y2 = int(max(node.y, node.parent.y) // cell_size)
+                for gx in range(x1, x2 + 1):
+                    for gy in range(y1, y2 + 1):
+                        grid.setdefault((gx, gy), []).append(node)
+        return grid
+        
+    @staticmethod
+    def segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+        """判断线段AB与CD是否严格相交"""
+        d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+        d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+        d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+        return d1 * d2 < 0 and d3 * d4 < 0
+        
+    def update_physics(self):
+        """更新节点位置的物理模拟"""
+        if self.settled and self.settings["布局"]["布局模式"] != "径向":
+            # 已稳定：不遍历节点，每帧只有这次判断的开销
+            self.root.after(16, self.update_physics)
+            return
+            
+        visible_nodes, clusters = self.get_visible_bodies()
+        # 聚合解除时把累计位移同步到后代
+        for node in self.clusters - clusters:
+            node.flush_shift()
+        if clusters != self.clusters:
+            self.needs_redraw = True  # 例如滚轮缩放跨过聚合屏幕半径
+        self.clusters = clusters
+        
+        if self.settings["布局"]["布局模式"] == "径向":
+            if self.layout_dirty:
+                self.compute_radial_layout()
+            moved = self.animate_to_targets(visible_nodes)
+            for node in clusters:
+                node.flush_shift()  # 拖动聚合节点产生的位移
+            if moved or self.dragging:
+                # 力导向模式在模拟循环中顺便刷新包围半径，这里在节点移动后统一刷新
+                self.root_node.refresh_radius(clusters)
+            self.root.after(16, self.update_physics)
+            return
+            
+        # 聚合节点按后代数量获得更大的排斥质量
+        masses = {node: math.sqrt(1 + node.descendant_count()) for node in clusters}
+        cutoff = self.edge_cutoff_radius()
+        edge_grid = self.build_edge_grid(visible_nodes, cutoff)
+        crossing = self.settings["物理引擎"]["线交叉排斥"]
+        if crossing:
+            edge_box_grid = self.build_edge_box_grid(visible_nodes, cutoff)
+            
+        def update_node_recursive(node):
+            # 中心节点不受力
+            if node.parent == None or node.parent.expanded == False:
+                node.vx = 0
+                node.vy = 0
+                for child in node.children:
+                    update_node_recursive(child)
+                return
+            old_x, old_y = node.x, node.y
+                
+            # 计算所有节点间的排斥力
+            for other in visible_nodes:
+                if other != node and other.parent and other.parent.expanded:
+                    dx = node.x - other.x
+                    dy = node.y - other.y
+                    dist = math.sqrt(dx*dx + dy*dy)
+                    if dist < self.settings["物理引擎"]["最小距离"]:
+                        dist = self.settings["物理引擎"]["最小距离"]
+                    force = self.settings["物理引擎"]["排斥力系数"] * masses.get(other, 1) / (dist * dist)
+                    node.vx += force * dx / dist
+                    node.vy += force * dy / dist
+            
+            # 计算线之间的排斥力，只考虑截断半径内相邻网格中的连线
+            line1_mid_x = (node.x + node.parent.x) / 2
+            line1_mid_y = (node.y + node.parent.y) / 2
+            cell_x = int(line1_mid_x // cutoff)
+            cell_y = int(line1_mid_y // cutoff)
+            for gx in (cell_x - 1, cell_x, cell_x + 1):
+                for gy in (cell_y - 1, cell_y, cell_y + 1):
+                    for other_node, line2_mid_x, line2_mid_y in edge_grid.get((gx, gy), ()):
+                        if other_node == node:
+                            continue
+                        dx = line1_mid_x - line2_mid_x
+                        dy = line1_mid_y - line2_mid_y
+                        dist = math.sqrt(dx*dx + dy*dy)
+                        if dist > cutoff:
+                            continue
+                        if dist < self.settings["物理引擎"]["最小距离"]:
+                            dist = self.settings["物理引擎"]["最小距离"]
+                        
+                        force = self.settings["物理引擎"]["线之间排斥力"] / (dist * dist)
+                        node.vx += force * dx / dist
+                        node.vy += force * dy / dist
+            
+            # 交叉连线额外排斥：把节点推回父节点所在的一侧
+            if crossing:
+                checked = set()
+                x1 = int(min(node.x, node.parent.x) // cutoff)
+                x2 = int(max(node.x, node.parent.x) // cutoff)
+                y1 = int(min(node.y, node.parent.y) // cutoff)
+                y2 = int(max(node.y, node.parent.y) // cutoff)
+                strength = (self.settings["物理引擎"]["线之间排斥力"] / 
+                            self.settings["物理引擎"]["最小距离"] ** 2)
+                for gx in range(x1, x2 + 1):
+                    for gy in range(y1, y2 + 1):
+                        for other_node in edge_box_grid.get((gx, gy), ()):
+                            if other_node in checked:
+                                continue
+                            checked.add(other_node)
+                            # 共享端点的连线不算交叉
+                            if (other_node == node or other_node == node.parent or 
+                                other_node.parent == node or other_node.parent == node.parent):
+                                continue
+                            ax, ay = other_node.parent.x, other_node.parent.y
+                            bx, by = other_node.x, other_node.y
+                            if not self.segments_intersect(node.parent.x, node.parent.y, 
+                                                           node.x, node.y, ax, ay, bx, by):
+                                continue
+                            length = math.sqrt((bx - ax)**2 + (by - ay)**2)
+                            if length == 0:
+                                continue
+                            nx = -(by - ay) / length
+                            ny = (bx - ax) / length
+                            side = (node.parent.x - ax) * nx + (node.parent.y - ay) * ny
+                            direction = 1 if side > 0 else -1
+                            node.vx += strength * direction * nx
+                            node.vy += strength * direction * ny
+            
+            # 计算弹簧力
+            if node.parent:
+                dx = node.x - node.parent.x
+                dy = node.y - node.parent.y
+                dist = math.sqrt(dx*dx + dy*dy)
+                # 根据深度增加目标距离
+                target_dist = self.settings["物理引擎"]["目标距离"] * (1 + node.depth * 0.5)
+                force = self.settings["物理引擎"]["弹簧系数"] * (dist - target_dist)
+                node.vx -= force * dx / dist
+                node.vy -= force * dy / dist
+                
+                # 限制节点相对根节点的方向在其角度范围内
+                angle_range = self.get_node_angle_range(node)
+                if angle_range and node.parent.parent is not None:
+                    start_angle, end_angle = angle_range
+                    center = (start_angle + end_angle) / 2
+                    root_dx = node.x - self.root_node.x
+                    root_dy = node.y - self.root_node.y
+                    # 换算到以范围中心为基准的(-pi, pi]，避免跨越±180度时误判
+                    offset = (math.atan2(root_dy, root_dx) - center + math.pi) % (2*math.pi) - math.pi
+                    if abs(offset) > end_angle - center:
+                        current_angle = center + math.copysign(end_angle - center, offset)
+                        # 根据角度计算新位置，与根节点的距离不变
+                        root_dist = math.sqrt(root_dx*root_dx + root_dy*root_dy)
+                        node.x = self.root_node.x + root_dist * math.cos(current_angle)
+                        node.y = self.root_node.y + root_dist * math.sin(current_angle)
+                    
+            # 限制最大速度
+            speed = math.sqrt(node.vx * node.vx + node.vy * node.vy)
+            if speed > self.settings["物理引擎"]["最大速度"]:
+                node.vx *= self.settings["物理引擎"]["最大速度"] / speed
+                node.vy *= self.settings["物理引擎"]["最大速度"] / speed
+                
+            # 更新速度和位置
+            node.vx *= self.settings["物理引擎"]["阻尼系数"]
+            node.vy *= self.settings["物理引擎"]["阻尼系数"]
+            node.x += node.vx
+            node.y += node.vy
+            nonlocal max_move
+            max_move = max(max_move, abs(node.x - old_x), abs(node.y - old_y))
+            
+            if node in clusters:
+                # 聚合节点的子树整体移动，累计超过半个像素才同步到后代
+                node.shift_x += node.x - old_x
+                node.shift_y += node.y - old_y
+                if abs(node.shift_x) > 0.5 or abs(node.shift_y) > 0.5:
+                    node.flush_shift()
+            elif node.expanded:
+                radius = 0
+                for child in node.children:
+                    update_node_recursive(child)
+                    radius = max(radius, math.hypot(child.x - node.x, child.y - node.y) + 
+                                 child.bounding_radius())
+                node._radius = radius  # 顺便刷新包围半径，供下一帧判断是否聚合
+                
+        max_move = 0
+        update_node_recursive(self.root_node)
+        if max_move * self.scale < SETTLE_EPSILON:
+            # 位移在屏幕上已不可见：停止模拟，直到编辑、拖动或缩放等触发重绘时再恢复
+            for node in visible_nodes:
+                node.vx = 0
+                node.vy = 0
+            self.settled = True
+        else:
+            self.needs_redraw = True
+        self.root.after(16, self.update_physics)
+        
+    def is_cluster(self, node):
+        """节点的子树是否作为一个整体参与模拟和绘制"""
+        if node.parent is None or not node.children:
+            return False
+        if not node.expanded:
+            return True
+        if node in self.opened_clusters:
+            return False
+        # 后代足够多且缩小到屏幕上很小时才聚合
+        return (node.descendant_count() >= self.settings["布局"]["聚合阈值"] and
+                node.bounding_radius() * self.scale < self.settings["布局"]["聚合屏幕半径"])
+        
+    def get_visible_bodies(self):
+        """获取参与模拟的节点列表和其中的聚合节点，不进入聚合节点的子树"""
+        bodies = []
+        clusters = set()
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            bodies.append(node)
+            if self.is_cluster(node):
+                clusters.add(node)
+            elif node.expanded:
+                stack.extend(node.children)
+        return bodies, clusters
+        
+    def get_all_nodes(self):
+        """获取所有节点的列表"""
+        nodes = []
+        def collect_nodes(node):
+            nodes.append(node)
+            if node.expanded:
+                for child in node.children:
+                    collect_nodes(child)
+        collect_nodes(self.root_node)
+        return nodes
+        
+    def add_child_node(self):
+        """添加新的子节点"""
+        if self.selected_node:
+            text = "新主题"
+            self.create_child_node(self.selected_node, text)
+            
+    def get_node_path(self, node):
+        """获取从根节点到当前节点的路径"""
+        return " > ".join(node.get_path())
+        
+    def build_prompt(self, node):
+        """在UI线程中生成完整提示词，工作线程只接触这个不可变的字符串"""
+        prompt = f"基于'{node.text}'生成{self.settings['自动生成']['单次生成数量']}个相关的子主题，每个主题一行，用换行符分隔，请直接给出主题名称，不要有任何多余文字，不要带序号"
+        # 如果设置了包含父节点路径，则在prompt中添加路径信息
+        if self.settings["自动生成"]["包含父节点路径"]:
+            prompt = f"在思维导图路径'{self.get_node_path(node)}'下，{prompt}"
+        return prompt
+        
+    def request_generation(self, node, use_cache=True):
+        """为当前导图的节点排队一次子主题生成请求，use_cache为False时总是请求新结果"""
+        prompt = self.build_prompt(node)
+        model = self.settings["自动生成"]["模型名称"]
+        # 其他导图刚刚得到的相同请求结果可以直接复用
+        cache_key = (model, prompt, tuple(child.text for child in node.children))
+        topics = self.response_cache.get(cache_key) if use_cache else None
+        if topics is not None:
+            self.result_queue.put((node, topics))
+            self.root.after_idle(self.process_results)
+            return
+        self.ensure_llm_worker()
+        self.llm_queue.put(self.doc, LLMRequest(
+            self.doc, node, prompt, model,
+            int(self.settings["自动生成"]["最大重试次数"]),
+            cache_key, time.perf_counter()
+        ))
+            
+    def llm_worker(self):
+        """LLM处理线程的工作函数，并发数由AIMD调度器控制"""
+        while True:
+            request = self.llm_queue.get()
+            attempt = 0
+            queue_wait = None
+            while True:
+                self.llm_limiter.acquire()
+                started = time.perf_counter()
+                if queue_wait is None:  # 只统计首次排队，不含重试和退避
+                    queue_wait = started - request.enqueued_at
+                first_token = None
+                parts = []
+                try:
+                    for chunk in self.get_llm(request.model).stream(request.prompt):
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(chunk)
+                except Exception as e:
+                    latency = time.perf_counter() - started
+                    self.llm_limiter.release(False)
+                    if attempt < request.max_retries and is_transient_error(e):
+                        # 指数退避后重试，带随机抖动避免同时重试
+                        time.sleep(0.5 * 2 ** attempt * (1 + random.random()))
+                        attempt += 1
+                        continue
+                    self.llm_metrics.record(queue_wait, first_token or 0.0, latency, len(parts),
+                                            False, attempt + 1)
+                    print(f"LLM错误: {e}")
+                    break
+                latency = time.perf_counter() - started
+                self.llm_limiter.release(True, latency / max(1, len(parts)))
+                self.llm_metrics.record(queue_wait, first_token or latency, latency, len(parts),
+                                        True, attempt + 1)
+                topics = "".join(parts).strip().split('\n')
+                self.response_cache.put(request.cache_key, topics)
+                self.result_queue.put((request.node, topics))
+                self.root.event_generate("<<LLMResult>>", when="tail")
+                break
+                
+    def process_results(self):
+        """处理结果队列中所有已完成的LLM结果"""
+        gen_num = int(self.settings["自动生成"]["单次生成数量"])
+        while True:
+            try:
+                node, topics = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            doc = self.find_document(node)
+            if doc is None:  # 请求期间节点已被删除、撤销或导图已关闭
+                continue
+            texts = [topic.strip() for topic in topics if topic.strip()][:gen_num]  # 忽略空字符串
+            if texts:
+                self.create_child_nodes(node, texts, doc)
+                self.save_state(doc)
+                
+    def find_document(self, node):
+        """返回节点所在的导图，节点已不在任何导图中时返回None"""
+        while node.parent is not None:
+            node = node.parent
+        for doc in self.documents:
+            if doc.root_node == node:
+                return doc
+        return None
+        
+    def create_child_nodes(self, parent_node, texts, doc=None):
+        """批量创建子节点，新节点的角度在允许范围内均匀分布；后台导图只更新数据"""
+        doc = doc or self.doc
+        count = len(parent_node.children) + len(texts)
+        if parent_node.parent is None:
+            # 根节点的子节点与已有子节点一起在整个圆周上重新均匀分布，从第一个子节点的方向开始
+            start = 0
+            if parent_node.children:
+                first_child = parent_node.children[0]
+                start = math.atan2(first_child.y - parent_node.y, first_child.x - parent_node.x)
+            angles = [start + 2*math.pi * i / count for i in range(count)]
+        else:
+            # 其余节点沿父节点相对根节点的方向，与已有子节点一起在子节点角度范围内重新均匀分布
+            parent_angle = math.atan2(parent_node.y - doc.root_node.y,
+                                      parent_node.x - doc.root_node.x)
+            span = math.pi * self.settings["布局"]["子节点角度范围"] / 180
+            start = parent_angle - span / 2
+            angles = [start + span * (i + 0.5) / count for i in range(count)]
+            
+        # 根据深度增加距离
+        distance = self.settings["物理引擎"]["目标距离"] * (1 + parent_node.depth * 0.5)
+        
+        # 已有子节点连同子树绕父节点转到新的方向，避免新节点与其重合
+        for child, angle in zip(parent_node.children, angles):
+            child.flush_shift()
+            current = math.atan2(child.y - parent_node.y, child.x - parent_node.x)
+            child.rotate_subtree(parent_node.x, parent_node.y, angle - current)
+            dx = parent_node.x + distance * math.cos(angle) - child.x
+            dy = parent_node.y + distance * math.sin(angle) - child.y
+            child.x += dx
+            child.y += dy
+            child.move_subtree(dx, dy)
+        angles = angles[len(parent_node.children):]
+            
+        new_nodes = []
+        for text, angle in zip(texts, angles):
+            new_x = parent_node.x + distance * math.cos(angle)
+            new_y = parent_node.y + distance * math.sin(angle)
+            new_node = MindMapNode(new_x, new_y, self.node_sizes, text, parent_node)
+            parent_node.children.append(new_node)
+            doc.search_index.add(new_node)
+            new_nodes.append(new_node)
+        parent_node.expanded = True  # 添加子节点时自动展开父节点
+        parent_node.invalidate_aggregate()
+        doc.layout_dirty = True
+        if doc is self.doc:
+            self.needs_redraw = True
+        return new_nodes
+            
+    def create_child_node(self, parent_node, text):
+        """创建新的子节点"""
+        # 计算新节点的位置
+        if parent_node.children:
+            # 获取最后一个子节点的角度
+            last_child = parent_node.children[-1]
+            dx = last_child.x - parent_node.x
+            dy = last_child.y - parent_node.y
+            last_angle = math.atan2(dy, dx)
+            if last_angle < 0:
+                last_angle += 2*math.pi
+                
+            # 根据父节点的深度确定限制角度范围
+            if parent_node == self.root_node:
+                # 根节点的子节点可以在360度范围内分布
+                min_angle = 0
+                max_angle = 2*math.pi
+            else:
+                # 非根节点的子节点在父节点相对根节点方向的120度范围内分布
+                parent_dx = parent_node.x - self.root_node.x
+                parent_dy = parent_node.y - self.root_node.y
+                parent_angle = math.atan2(parent_dy, parent_dx)
+                if parent_angle < 0:
+                    parent_angle += 2*math.pi
+                    
+                min_angle = parent_angle - math.pi/3  # 父节点角度减60度
+                max_angle = parent_angle + math.pi/3  # 父节点角度加60度
+                
+            # 计算新节点的角度，确保在限制范围内
+            angle = last_angle + math.pi/6  # 在最后一个子节点基础上增加30度
+            angle = max(min_angle, min(max_angle, angle))  # 限制在允许范围内
+        else:
+            # 第一个子节点
+            if parent_node == self.root_node:
+                angle = 0  # 根节点的第一个子节点向右
+            else:
+                # 非根节点的第一个子节点沿父节点相对根节点的方向
+                parent_dx = parent_node.x - self.root_node.x
+                parent_dy = parent_node.y - self.root_node.y
+                angle = math.atan2(parent_dy, parent_dx)
+            
+        # 根据深度增加距离
+        distance = self.settings["物理引擎"]["目标距离"] * (1 + parent_node.depth * 0.5)
+        
+        new_x = parent_node.x + distance * math.cos(angle)
+        new_y = parent_node.y + distance * math.sin(angle)
+        
+        new_node = MindMapNode(new_x, new_y, self.node_sizes, text, parent_node)
+        parent_node.children.append(new_node)
+        parent_node.expanded = True  # 添加子节点时自动展开父节点
+        parent_node.invalidate_aggregate()
+        self.search_index.add(new_node)
+        self.layout_dirty = True
+        self.needs_redraw = True
+        return new_node
+            
+    def delete_selected_node(self, event=None):
+        """删除选中的节点及其子节点"""
+        if self.selected_node and self.selected_node != self.root_node:
+            if self.selected_node.parent:
+                self.selected_node.parent.children.remove(self.selected_node)
+                self.selected_node.parent.invalidate_aggregate()
+            self.search_index.remove_subtree(self.selected_node)
+            self.selected_node = None
+            self.layout_dirty = True
+            self.needs_redraw = True
+            
+    def toggle_auto_generate(self):
+        self.auto_generating = not self.auto_generating
+        if self.auto_generating:
+            self.start_btn.config(text="停止自动生成")
+            self.auto_generate_tick()
+        else:
+            self.start_btn.config(text="开始自动生成")
+            if self.auto_gen_job is not None:
+                self.root.after_cancel(self.auto_gen_job)
+                self.auto_gen_job = None
+            
+    def auto_generate_tick(self):
+        """自动生成定时器，在UI线程中读取选中节点并排队请求"""
+        if self.selected_node:
+            self.request_generation(self.selected_node)
+        self.auto_gen_job = self.root.after(
+            int(self.settings["自动生成"]["生成间隔(毫秒)"]), self.auto_generate_tick)
+            
+    def draw(self):
+        if not self.needs_redraw:
+            self.root.after(16, self.draw)
+            return
+        self.needs_redraw = False
+        self.settled = False  # 画面有变化时恢复模拟，由模拟自行判断是否仍然稳定
+        self.canvas.delete("all")
+        
+        # 绘制网格（如果启用）
+        if self.settings["布局"]["网格显示"]:
+            grid_size = self.settings["布局"]["网格大小"] * self.scale
+            # 绘制垂直线
+            for x in range(0, int(self.canvas.winfo_width()), int(grid_size)):
+                self.canvas.create_line(x, 0, x, self.canvas.winfo_height(), fill="#EEEEEE")
+            # 绘制水平线
+            for y in range(0, int(self.canvas.winfo_height()), int(grid_size)):
+                self.canvas.create_line(0, y, self.canvas.winfo_width(), y, fill="#EEEEEE")
+
+        def draw_node_recursive(node):
+            if not node.parent or node.parent.expanded:
+                # 绘制连接线
+                if node.parent:
+                    line_style = self.settings["节点外观"]["连接线样式"]
+                    line_width = self.settings["节点外观"]["连接线粗细"]
+                    line_color = self.settings["节点外观"]["连接线颜色"]
+                    
+                    if line_style == "直线":
+                        self.canvas.create_line(
+                            self.transform_x(node.parent.x),
+                            self.transform_y(node.parent.y),
+                            self.transform_x(node.x),
+                            self.transform_y(node.y),
+                            fill=line_color,
+                            width=line_width
+                        )
+                    elif line_style == "曲线":
+                        cx = (node.x + node.parent.x) / 2
+                        cy = (node.y + node.parent.y) / 2
+                        self.canvas.create_line(
+                            self.transform_x(node.parent.x),
+                            self.transform_y(node.parent.y),
+                            self.transform_x(cx),
+                            self.transform_y(cy),
+                            self.transform_x(node.x),
+                            self.transform_y(node.y),
+                            fill=line_color,
+                            width=line_width,
+                            smooth=True
+                        )
+                    elif line_style == "折线":
+                        mid_x = (node.x + node.parent.x) / 2
+                        self.canvas.create_line(
+                            self.transform_x(node.parent.x),
+                            self.transform_y(node.parent.y),
+                            self.transform_x(mid_x),
+                            self.transform_y(node.parent.y),
+                            self.transform_x(mid_x),
+                            self.transform_y(node.y),
+                            self.transform_x(node.x),
+                            self.transform_y(node.y),
+                            fill=line_color,
+                            width=line_width
+                        )
+
+                # 绘制节点
+                x1 = self.transform_x(node.x - node.width/2)
+                y1 = self.transform_y(node.y - node.height/2)
+                x2 = self.transform_x(node.x + node.width/2)
+                y2 = self.transform_y(node.y + node.height/2)
+                
+                # 使用主题配色
+                if node == self.root_node:
+                    fill_color = self.settings["主题配色"]["根节点"]
+                else:
+                    depth_colors = [
+                        self.settings["主题配色"]["一级节点"],
+                        self.settings["主题配色"]["二级节点"],
+                        self.settings["主题配色"]["三级节点"]
+                    ]
+                    fill_color = depth_colors[min(node.depth - 1, len(depth_colors) - 1)]
+
+                if node == self.selected_node:
+                    fill_color = self.settings["主题配色"]["选中节点"]
+
+                # 绘制节点（带阴影）
+                radius = self.settings["节点外观"]["节点圆角半径"] * self.scale
+                if self.settings["节点外观"]["节点阴影"]:
+                    # 绘制阴影
+                    shadow_offset = 4 * self.scale
+                    self.canvas.create_rectangle(
+                        x1 + shadow_offset, y1 + shadow_offset,
+                        x2 + shadow_offset, y2 + shadow_offset,
+                        fill="#CCCCCC", width=0
+                    )
+
+                # 绘制圆角矩形
+                self.canvas.create_rectangle(
+                    x1+radius, y1, x2-radius, y2,
+                    fill=fill_color, width=0
+                )
+                self.canvas.create_rectangle(
+                    x1, y1+radius, x2, y2-radius,
+                    fill=fill_color, width=0
+                )
+                self.canvas.create_arc(
+                    x1, y1, x1+2*radius, y1+2*radius,
+                    start=90, extent=90, fill=fill_color, width=0
+                )
+                self.canvas.create_arc(
+                    x2-2*radius, y1, x2, y1+2*radius,
+                    start=0, extent=90, fill=fill_color, width=0
+                )
+                self.canvas.create_arc(
+                    x1, y2-2*radius, x1+2*radius, y2,
+                    start=180, extent=90, fill=fill_color, width=0
+                )
+                self.canvas.create_arc(
+                    x2-2*radius, y2-2*radius, x2, y2,
+                    start=270, extent=90, fill=fill_color, width=0
+                )
+                
+                # 设置文字大小和颜色
+                font_size = self.node_sizes.font_size(node.depth, self.text_scale)
+                
+                self.canvas.create_text(
+                    self.transform_x(node.x),
+                    self.transform_y(node.y),
+                    text=node.text,
+                    width=node.width * self.text_scale * 0.9,
+                    font=self.text_layout.font(font_size),
+                    fill=self.settings["主题配色"]["文字颜色"]
+                )
+                
+                # 如果有子节点，显示展开/收起按钮
+                if node.children:
+                    button_x = x2 - 15 * self.scale
+                    button_y = self.transform_y(node.y)
+                    button_size = 12 * self.scale
+                    
+                    # 绘制圆形按钮背景
+                    self.canvas.create_oval(
+                        button_x - button_size/2,
+                        button_y - button_size/2,
+                        button_x + button_size/2,
+                        button_y + button_size/2,
+                        fill="#FFFFFF",
+                        outline="#666666"
+                    )
+                    
+                    # 绘制+/-符号
+                    self.canvas.create_text(
+                        button_x,
+                        button_y,
+                        text="+" if not node.expanded else "-",
+                        font=self.text_layout.font(int(10 * self.text_scale)),
+                        fill="#666666"
+                    )
+                
+                if node.expanded and self.is_cluster(node):
+                    # 聚合节点：画出子树范围和后代数量，不绘制子树
+                    radius = node.bounding_radius() * self.scale
+                    cx = self.transform_x(node.x)
+                    cy = self.transform_y(node.y)
+                    self.canvas.create_oval(
+                        cx - radius, cy - radius, cx + radius, cy + radius,
+                        outline=self.settings["节点外观"]["连接线颜色"], dash=(4, 4)
+                    )
+                    self.canvas.create_text(
+                        cx, y2 + 10 * self.scale,
+                        text=f"+{node.descendant_count()}",
+                        font=self.text_layout.font(max(8, int(10 * self.text_scale))),
+                        fill=self.settings["节点外观"]["连接线颜色"]
+                    )
+                elif node.expanded:
+                    for child in node.children:
+                        draw_node_recursive(child)
+        
+        draw_node_recursive(self.root_node)
+        self.root.after(16, self.draw)
+    def transform_x(self, x):
+        return (x + self.offset_x) * self.scale
+        
+    def transform_y(self, y):
+        return (y + self.offset_y) * self.scale
+        
+    def inverse_transform_x(self, x):
+        return x / self.scale - self.offset_x
+        
+    def inverse_transform_y(self, y):
+        return y / self.scale - self.offset_y
+        
+    def find_node_at(self, x, y):
+        def check_node(node):
+            if not node.parent or node.parent.expanded:
+                tx = self.transform_x(node.x)
+                ty = self.transform_y(node.y)
+                
+                # 检查是否点击了展开/收起按钮
+                if node.children:
+                    button_x = tx + node.width/2 * self.scale - 15 * self.scale
+                    button_y = ty
+                    button_size = 12 * self.scale
+                    
+                    if (button_x - button_size/2 <= x <= button_x + button_size/2 and
+                        button_y - button_size/2 <= y <= button_y + button_size/2):
+                        if node.expanded and self.is_cluster(node):
+                            self.opened_clusters.add(node)  # 展开聚合节点
+                        else:
+                            node.expanded = not node.expanded
+                            self.opened_clusters.discard(node)
+                        self.layout_dirty = True
+                        self.needs_redraw = True
+                        return None
+                
+                if (tx - node.width/2 * self.scale <= x <= tx + node.width/2 * self.scale and
+                    ty - node.height/2 * self.scale <= y <= ty + node.height/2 * self.scale):
+                    return node
+                    
+                if node.expanded and not self.is_cluster(node):
+                    for child in node.children:
+                        result = check_node(child)
+                        if result:
+                            return result
+            return None
+            
+        return check_node(self.root_node)
+        
+    def on_click(self, event):
+        node = self.find_node_at(event.x, event.y)
+        self.needs_redraw = True
+        if node:
+            self.selected_node = node
+            self.dragging = True
+            self.drag_start_x = event.x
+            self.drag_start_y = event.y
+        else:
+            self.selected_node = None
+            self.dragging = True
+            self.drag_start_x = event.x
+            self.drag_start_y = event.y
+            
+    def on_drag(self, event):
+        if self.dragging:
+            dx = event.x - self.drag_start_x
+            dy = event.y - self.drag_start_y
+            
+            if self.selected_node:
+                self.selected_node.x += dx / self.scale
+                self.selected_node.y += dy / self.scale
+                if self.selected_node in self.clusters:
+                    # 聚合节点的子树跟随拖动
+                    self.selected_node.shift_x += dx / self.scale
+                    self.selected_node.shift_y += dy / self.scale
+                if self.selected_node == self.root_node:
+                    self.layout_dirty = True  # 径向布局跟随根节点移动
+                self.needs_redraw = True
+            else:
+                # 平移直接移动画布上已有的图元
+                self.offset_x += dx / self.scale
+                self.offset_y += dy / self.scale
+                self.canvas.move("all", dx, dy)
+                
+            self.drag_start_x = event.x
+            self.drag_start_y = event.y
+            
+    def on_release(self, event):
+        self.dragging = False
+        if self.settings["布局"]["网格显示"]:
+            self.needs_redraw = True  # 补齐平移后露出的网格
+        
+    def on_right_click(self, event):
+        node = self.find_node_at(event.x, event.y)
+        if node:
+            self.request_generation(node, use_cache=False)  # 手动请求总是重新生成
+            
+    def on_double_click(self, event):
+        node = self.find_node_at(event.x, event.y)
+        if node:
+            dialog = tk.Toplevel(self.root)
+            dialog.title("编辑节点")
+            
+            entry = ttk.Entry(dialog)
+            entry.insert(0, node.text)
+            entry.pack(padx=20, pady=20)
+            
+            def save():
+                node.text = entry.get()
+                self.search_index.update(node)
+                self.needs_redraw = True
+                dialog.destroy()
+                
+            ttk.Button(dialog, text="确定", command=save).pack(pady=10)
+            
+    def on_mousewheel(self, event):
+        # Windows下的滚轮事件
+        delta = event.delta / 120.0
+        
+        # 获取鼠标在画布上的坐标
+        mouse_x = event.x
+        mouse_y = event.y
+        
+        # 获取鼠标在世界坐标系中的位置
+        world_x = self.inverse_transform_x(mouse_x)
+        world_y = self.inverse_transform_y(mouse_y)
+        
+        # 更新缩放比例
+        old_scale = self.scale
+        self.scale *= (1.1 ** delta)
+        self.scale = max(0.1, min(5.0, self.scale))  # 限制缩放范围
+        
+        # 计算缩放后鼠标位置对应的世界坐标
+        new_world_x = self.inverse_transform_x(mouse_x)
+        new_world_y = self.inverse_transform_y(mouse_y)
+        
+        # 调整偏移量，使鼠标位置保持不变
+        self.offset_x += (new_world_x - world_x)
+        self.offset_y += (new_world_y - world_y)
+        
+        # 直接缩放画布上已有的图元，文字只在跨过缩放档位时重新排版
+        factor = self.scale / old_scale
+        self.canvas.scale("all", mouse_x, mouse_y, factor, factor)
+        if self.quantized_scale() != self.text_scale or self.settings["布局"]["网格显示"]:
+            self.schedule_redraw()
+            
+    def quantized_scale(self):
+        """将缩放比例量化到最近的排版档位"""
+        return TEXT_ZOOM_STEP ** round(math.log(self.scale, TEXT_ZOOM_STEP))
+        
+    def schedule_redraw(self, delay=150):
+        """合并连续滚轮事件，停止滚动后再重新排版"""
+        if self.redraw_job is not None:
+            self.root.after_cancel(self.redraw_job)
+        self.redraw_job = self.root.after(delay, self.finish_zoom)
+        
+    def finish_zoom(self):
+        self.redraw_job = None
+        self.text_scale = self.quantized_scale()
+        self.needs_redraw = True
+    def undo(self):
+        """撤销操作"""
+        if len(self.history) > 1:
+            self.future.append(self.history.pop())
+            state = self.history[-1]
+            self.root_node = state.to_node(self.node_sizes)
+            self.search_index.invalidate(self.root_node)
+            self.clusters = set()  # 不再引用被替换的树
+            self.opened_clusters = set()
+            self.layout_dirty = True
+            self.needs_redraw = True
+
+    def redo(self):
+        """重做操作"""
+        if self.future:
+            state = self.future.pop()
+            self.history.append(state)
+            self.root_node = state.to_node(self.node_sizes)
+            self.search_index.invalidate(self.root_node)
+            self.clusters = set()  # 不再引用被替换的树
+            self.opened_clusters = set()
+            self.layout_dirty = True
+            self.needs_redraw = True
+
+    def open_document(self, title, root_node, layout=False):
+        """在新标签页中打开导图并切换过去，layout为True时先放到径向布局位置"""
+        doc = MapDocument(title, root_node)
+        self.documents.append(doc)
+        tab = ttk.Frame(self.tabs, height=0)
+        self.tab_documents[str(tab)] = doc
+        self.doc = doc
+        self.tabs.add(tab, text=title)
+        self.tabs.select(tab)
+        if layout:
+            self.apply_layout()  # 第一条历史记录保存布局后的位置
+        self.save_state(doc)
+        self.needs_redraw = True
+        return doc
+        
+    def on_tab_changed(self, event=None):
+        """切换当前导图，后台导图不再参与模拟和绘制"""
+        self.doc = self.tab_documents[self.tabs.select()]
+        self.dragging = False
+        self.needs_redraw = True
+        
+    def close_map(self):
+        """关闭当前导图，至少保留一张"""
+        if len(self.documents) == 1:
+            return
+        doc = self.doc
+        self.llm_queue.discard(doc)
+        self.documents.remove(doc)
+        tab = self.tabs.select()
+        del self.tab_documents[tab]
+        self.tabs.forget(tab)  # 自动选中相邻的标签页
+        self.on_tab_changed()
+        
+    def new_map(self):
+        """在新标签页中新建思维导图"""
+        root_node = MindMapNode(600, 400, self.node_sizes, "中心主题")
+        root_node.expanded = True # 根节点默认展开
+        self.map_counter += 1
+        self.open_document(f"导图{self.map_counter}", root_node)
+
+    def export_map(self):
+        """导出思维导图到文件"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("PNG images", "*.png"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        if filename.lower().endswith(".png"):
+            self.export_png(filename)
+        else:
+            self.export_json(filename)
+            
+    def export_json(self, filename):
+        """在后台线程中把当前导图流式写入JSON，工具栏显示进度"""
+        snapshot = MapSnapshot(self.root_node)
+        indent = 2 if self.settings["导出"]["缩进JSON"] else None
+        progress = {"written": 0, "error": None, "done": False}
+        bar = ttk.Progressbar(self.toolbar, length=120, maximum=len(snapshot))
+        bar.pack(side="right", padx=5)
+        
+        def worker():
+            try:
+                # 先写临时文件，失败时不破坏已有文件
+                with open(filename + ".tmp", 'w', encoding='utf-8') as f:
+                    write_map_json(snapshot, f, indent,
+                                   lambda written: progress.__setitem__("written", written))
+                os.replace(filename + ".tmp", filename)
+            except Exception as e:
+                progress["error"] = e
+            progress["done"] = True
+            
+        threading.Thread(target=worker, daemon=True).start()
+        self.poll_export(bar, progress)
+        
+    def poll_export(self, bar, progress):
+        """刷新导出进度条，完成后移除"""
+        bar["value"] = progress["written"]
+        if not progress["done"]:
+            self.root.after(100, self.poll_export, bar, progress)
+            return
+        bar.destroy()
+        if progress["error"] is not None:
+            tk.messagebox.showerror("错误", f"导出失败: {str(progress['error'])}")
+
+    def export_png(self, filename):
+        """按导出设置离屏渲染为PNG图片"""
+        items = collect_render_items(self.root_node)
+        try:
+            render_png(
+                items, self.settings, filename,
+                dpi=self.settings["导出"]["图片DPI"],
+                tile_size=int(self.settings["导出"]["分块大小"]),
+                processes=int(self.settings["导出"]["渲染进程数"])
+            )
+        except Exception as e:
+            tk.messagebox.showerror("错误", f"导出失败: {str(e)}")
+
+    def import_map(self):
+        """从文件导入思维导图"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if filename:
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    root_node = read_map_json(f, self.node_sizes)
+                # 径向布局下直接放到布局位置，无需等待动画或模拟收敛
+                self.open_document(os.path.basename(filename), root_node,
+                                   layout=self.settings["布局"]["布局模式"] == "径向")
+            except Exception as e:
+                tk.messagebox.showerror("错误", f"导入失败: {str(e)}")
+
+    def copy_node(self):
+        """复制选中的节点"""
+        if self.selected_node and self.selected_node != self.root_node:
+            self.clipboard = self.selected_node.to_dict()
+
+    def paste_node(self):
+        """粘贴节点"""
+        if self.clipboard and self.selected_node:
+            new_node = MindMapNode.from_dict(self.clipboard, self.node_sizes, self.selected_node)
+            self.selected_node.children.append(new_node)
+            self.selected_node.expanded = True
+            self.selected_node.invalidate_aggregate()
+            self.search_index.add_subtree(new_node)
+            self.layout_dirty = True
+            self.needs_redraw = True
+            self.save_state()
+
+    def show_search_results(self):
+        """在弹出窗口中列出搜索结果，双击或回车跳转到节点"""
+        results = self.search_index.search(self.search_entry.get())
+        if self.search_window is not None and self.search_window.winfo_exists():
+            self.search_window.destroy()
+        self.search_window = tk.Toplevel(self.root)
+        self.search_window.title(f"搜索结果 ({len(results)})")
+        
+        listbox = tk.Listbox(self.search_window, width=60, height=15,
+                             font=("Microsoft YaHei", 10))
+        listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        for node in results:
+            listbox.insert("end", self.get_node_path(node))
+            
+        def jump(event=None):
+            selection = listbox.curselection()
+            if selection:
+                self.jump_to_node(results[selection[0]])
+                
+        listbox.bind("<Double-Button-1>", jump)
+        listbox.bind("<Return>", jump)
+        if results:
+            listbox.selection_set(0)
+            listbox.focus_set()
+            
+    def jump_to_node(self, node):
+        """展开节点的所有祖先，选中节点并将视图居中到该节点"""
+        if self.find_document(node) is not self.doc:  # 搜索后切换了导图或节点已被删除
+            return
+        ancestor = node.parent
+        while ancestor is not None:
+            if not ancestor.expanded:
+                ancestor.expanded = True
+                self.layout_dirty = True
+            ancestor = ancestor.parent
+        # 祖先中的密集聚合也要展开，否则选中的节点不会被绘制
+        ancestor = node.parent
+        while ancestor is not None:
+            if self.is_cluster(ancestor):
+                self.opened_clusters.add(ancestor)
+            ancestor = ancestor.parent
+        self.selected_node = node
+        self.offset_x = self.canvas.winfo_width() / (2 * self.scale) - node.x
+        self.offset_y = self.canvas.winfo_height() / (2 * self.scale) - node.y
+        self.needs_redraw = True
+
+def export_png_headless(json_file, png_file, dpi, tile_size, processes, font_path=""):
+    """不创建窗口，直接把导出的JSON渲染为PNG，用于批量生成缩略图"""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings["导出"]["字体路径"] = font_path
+    # 用导出字体测量文字，节点像画布上一样随文字加宽增高
+    sizes = NodeSizes(settings, PillowTextLayout(font_path))
+    with open(json_file, 'r', encoding='utf-8') as f:
+        root_node = read_map_json(f, sizes)
+    return render_png(collect_render_items(root_node), settings, png_file,
+                      dpi=dpi, tile_size=tile_size, processes=processes)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="思维导图生成器")
+    parser.add_argument("--export-png", nargs=2, metavar=("JSON", "PNG"),
+                        help="不打开窗口，将思维导图文件渲染为PNG")
+    parser.add_argument("--dpi", type=float, default=DEFAULT_SETTINGS["导出"]["图片DPI"])
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_SETTINGS["导出"]["分块大小"])
+    parser.add_argument("--processes", type=int, default=DEFAULT_SETTINGS["导出"]["渲染进程数"])
+    parser.add_argument("--font", default=DEFAULT_SETTINGS["导出"]["字体路径"],
+                        help="导出图片使用的字体文件，默认在常见中文字体中查找")
+    args = parser.parse_args()
+    if args.export_png:
+        export_png_headless(*args.export_png, args.dpi, args.tile_size, args.processes, args.font)
+    else:
+        mind_map = MindMap()
+        mind_map.root.mainloop()
\ No newline at end of file
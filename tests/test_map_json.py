@@ -0,0 +1,83 @@
+"""流式JSON导入导出的往返测试"""
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test import (DEFAULT_SETTINGS, MapSnapshot, MindMapNode, NodeSizes,
+                  _json_events, read_map_json, write_map_json)
+
+
+class ChunkedReader(io.StringIO):
+    """每次最多返回size个字符，模拟文件块边界落在任意位置"""
+    def __init__(self, text, size):
+        super().__init__(text)
+        self.size = size
+
+    def read(self, n=-1):
+        return super().read(self.size)
+
+
+def build_map(sizes):
+    root = MindMapNode(600.0, 400.0, sizes, "中心主题")
+    root.expanded = True
+    for i in range(5):
+        child = MindMapNode(123456.5 + i, -0.25 * i, sizes, f"子主题{i}", root)
+        child.expanded = i % 2 == 0
+        root.children.append(child)
+        for j in range(3):
+            child.children.append(MindMapNode(1e-7 * j, 2.5e10, sizes, f'引号"\\换行\n{j}', child))
+    return root
+
+
+@pytest.fixture
+def sizes():
+    return NodeSizes(DEFAULT_SETTINGS)
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_output_matches_json_dumps(sizes, indent):
+    root = build_map(sizes)
+    out = io.StringIO()
+    write_map_json(MapSnapshot(root), out, indent)
+    separators = (",", ":") if indent is None else None
+    assert out.getvalue() == json.dumps(root.to_dict(), ensure_ascii=False,
+                                        indent=indent, separators=separators)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 80, 4096])
+def test_round_trip_with_long_whitespace(sizes, chunk_size):
+    root = build_map(sizes)
+    # 在分隔符后插入长空白，使数字和字面量跨过块边界
+    text = json.dumps(root.to_dict(), ensure_ascii=False)
+    text = text.replace(":", ":" + " " * 70).replace(",", "," + "\n" * 65)
+    loaded = read_map_json(ChunkedReader(text, chunk_size), sizes)
+    assert loaded.to_dict() == root.to_dict()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 80])
+def test_children_before_fields(sizes, chunk_size):
+    text = ('{"children":[{"extra":{"a":[1,{"b":2}]},"text":"c","children":[],'
+            '"y":-1.5e2,"x":3,"expanded":true}],"text":"r","x":0,"y":0,"expanded":false}')
+    root = read_map_json(ChunkedReader(text, chunk_size), sizes)
+    assert root.to_dict() == {"x": 0, "y": 0, "text": "r", "expanded": False, "children": [
+        {"x": 3, "y": -150, "text": "c", "expanded": True, "children": []}]}
+    assert root.children[0].parent is root
+    assert root.children[0].depth == 1
+
+
+@pytest.mark.parametrize("text", ["", '{"x":1', '{"x":@}'])
+def test_invalid_input(sizes, text):
+    with pytest.raises(ValueError):
+        read_map_json(io.StringIO(text), sizes)
+
+
+def test_events_keys_and_values():
+    events = list(_json_events(io.StringIO('{"a": [1, true], "b": {"c": null}}')))
+    assert events == [("{", None), ("key", "a"), ("[", None), ("value", 1.0),
+                      ("value", True), ("]", None), ("key", "b"), ("{", None),
+                      ("key", "c"), ("value", None), ("}", None), ("}", None)]